@@ -0,0 +1,131 @@
+"""
+Local stand-in for the Telegram Bot API endpoints the bot calls.
+Run from src/ with: python -m benchmarks.fake_bot_api --port 8081 --latency 0.03 --rate-429 0.01
+
+Point a Bot at it with base_url="http://127.0.0.1:8081/bot".
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from urllib.parse import parse_qs
+
+from utils.http import start_http_server
+
+
+def _message(chat_id, text=None):
+    return {
+        "message_id": random.randint(1, 2 ** 31),
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "text": text or "",
+    }
+
+
+def _invite_link(params):
+    return {
+        "invite_link": f"https://t.me/+fake{random.getrandbits(48):012x}",
+        "creator": {"id": 1, "is_bot": True, "first_name": "bench"},
+        "creates_join_request": params.get("creates_join_request") == "true",
+        "is_primary": False,
+        "is_revoked": False,
+        "member_limit": int(params["member_limit"]) if "member_limit" in params else None,
+        "expire_date": int(params["expire_date"]) if "expire_date" in params else None,
+    }
+
+
+RESULTS = {
+    "getMe": lambda params: {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"},
+    "sendMessage": lambda params: _message(int(params.get("chat_id", 0)), params.get("text")),
+    "sendDocument": lambda params: _message(int(params.get("chat_id", 0))),
+    "editMessageText": lambda params: _message(int(params.get("chat_id", 0)), params.get("text")),
+    "banChatMember": lambda params: True,
+    "unbanChatMember": lambda params: True,
+    "approveChatJoinRequest": lambda params: True,
+    "declineChatJoinRequest": lambda params: True,
+    "answerCallbackQuery": lambda params: True,
+    "setWebhook": lambda params: True,
+    "deleteWebhook": lambda params: True,
+    "createChatInviteLink": _invite_link,
+    "revokeChatInviteLink": _invite_link,
+}
+
+
+class FakeBotAPI:
+    """
+    Serves /bot<token>/<method> with canned results.
+    latency: mean seconds per request (uniform +/- jitter fraction).
+    rate_429: probability of answering 429 with retry_after seconds.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.5, rate_429=0.0, retry_after=1, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.requests = Counter()
+        self.throttled = Counter()
+        self.server = None
+
+    def _params(self, request):
+        content_type = request.headers.get("content-type", "")
+        if "json" in content_type:
+            return json.loads(request.body or b"{}")
+        if "x-www-form-urlencoded" in content_type:
+            return {key: values[0] for key, values in parse_qs(request.body.decode()).items()}
+        return {}
+
+    async def handle(self, request):
+        _, _, method = request.path.rpartition("/")
+        if method not in RESULTS:
+            return 404, json.dumps({"ok": False, "error_code": 404, "description": "Not Found"}).encode(), \
+                "application/json"
+        self.requests[method] += 1
+        if self.latency:
+            spread = self.latency * self.jitter
+            await asyncio.sleep(max(0.0, self.random.uniform(self.latency - spread, self.latency + spread)))
+        if self.rate_429 and self.random.random() < self.rate_429:
+            self.throttled[method] += 1
+            body = {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+            return 429, json.dumps(body).encode(), "application/json"
+        body = {"ok": True, "result": RESULTS[method](self._params(request))}
+        return 200, json.dumps(body).encode(), "application/json"
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.server = await start_http_server(host, port, self.handle)
+        return self.server.sockets[0].getsockname()[1]
+
+    def base_url(self, port):
+        return f"http://127.0.0.1:{port}/bot"
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+
+async def _main(args):
+    api = FakeBotAPI(args.latency, args.jitter, args.rate_429, args.retry_after, args.seed)
+    port = await api.start(args.host, args.port)
+    print(f"Fake Bot API on {api.base_url(port)}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.03)
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(_main(parser.parse_args()))
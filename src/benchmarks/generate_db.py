@@ -0,0 +1,90 @@
+"""
+Generate a synthetic member database for benchmarks.
+Run from src/ with: python -m benchmarks.generate_db --users 100000 --out /tmp/bench.db
+"""
+import argparse
+import os
+import random
+from datetime import date, timedelta
+
+from db.database import create_connection, create_tables, seed_stats
+
+FIRST_NAMES = ["Ana", "Luis", "María", "Carlos", "Sofía", "Jorge", "Lucía", "Pedro", "Valentina", "Diego"]
+LAST_NAMES = ["García", "Pérez", "López", "Martínez", "Gómez", "Díaz", "Torres", "Ruiz", "", ""]
+
+
+def _offset_realistic(rng):
+    """
+    Days from today to paid_until. Most members are active and spread over
+    the next 30 days, with a spike on the 1st/15th renewal days; a tail has
+    expired recently and a few long ago.
+    """
+    roll = rng.random()
+    if roll < 0.70:
+        return rng.randint(0, 30)
+    if roll < 0.85:
+        return rng.choice((1, 15, 16, 30))
+    if roll < 0.97:
+        return -rng.randint(1, 30)
+    return -rng.randint(31, 365)
+
+
+def _offset_uniform(rng):
+    return rng.randint(-60, 60)
+
+
+DISTRIBUTIONS = {"realistic": _offset_realistic, "uniform": _offset_uniform}
+
+
+def generate(path, users, distribution="realistic", seed=0, today=None, chunk=10000, first_user_id=10 ** 9):
+    """Create `path` with `users` members and one payment each. Returns the path."""
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    today = today or date.today()
+    offset = DISTRIBUTIONS[distribution]
+
+    conn = create_connection(path)
+    create_tables(conn)
+    for start in range(0, users, chunk):
+        rows = []
+        for i in range(start, min(users, start + chunk)):
+            paid_until = today + timedelta(days=offset(rng))
+            join_date = paid_until - timedelta(days=30 * rng.randint(1, 12))
+            rows.append((
+                first_user_id + i,
+                f"user{i}" if rng.random() < 0.8 else "",
+                rng.choice(FIRST_NAMES),
+                rng.choice(LAST_NAMES),
+                join_date.isoformat(),
+                paid_until.isoformat(),
+                (paid_until - timedelta(days=30)).isoformat(),
+                paid_until.toordinal(),
+            ))
+        conn.executemany("""
+            INSERT INTO users (telegram_user_id, username, first_name, last_name, join_date, paid_until,
+                               last_payment_date, paid_until_day)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        conn.execute("""
+            INSERT INTO payments (user_id, payment_date, paid_until)
+            SELECT id, last_payment_date, paid_until FROM users WHERE id > (SELECT IFNULL(MAX(user_id), 0) FROM payments)
+        """)
+        conn.commit()
+    # The rows above bypass db/repository.py, so rebuild the /stats aggregates from them
+    seed_stats(conn)
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--distribution", choices=sorted(DISTRIBUTIONS), default="realistic")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench.db")
+    args = parser.parse_args()
+    generate(args.out, args.users, args.distribution, args.seed)
+    print(f"Generated {args.users} users in {args.out}")
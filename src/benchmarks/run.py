@@ -0,0 +1,406 @@
+"""
+Throughput and latency benchmarks for notify_users, /expiring, /aprobar and
+update_database, run against a synthetic database and the local fake Bot API.
+Run from src/ with:
+python -m benchmarks.run --users 100000 --latency 0.03 --rate-429 0.01 --out report.json
+
+The TELEGRAM_* settings apply as in production; raise TELEGRAM_GLOBAL_RATE
+to measure the bot itself rather than the flood-control limit.
+
+Every run with the same arguments and seed uses the same data and the same
+injected errors. --baseline compares against an earlier report and exits
+non-zero when a benchmark's throughput dropped by more than --tolerance.
+"""
+import os
+
+# The modules under test read their settings at import time
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ.setdefault("ADMIN_IDS", "1")
+os.environ.setdefault("CHANNEL_ID", "-1001")
+os.environ.setdefault("SESSION_STRING", "bench")
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import closing
+from types import SimpleNamespace
+
+from telegram import Bot
+from telethon.tl import types
+from telethon.tl.types import ChannelParticipant
+
+from benchmarks.fake_bot_api import FakeBotAPI
+from benchmarks.generate_db import DISTRIBUTIONS, generate
+from bot import commands, outbox, update_db
+from bot.telegram_api import api, build_request
+from config.config import ADMIN_IDS
+from cron import tasks
+from db import repository
+
+logger = logging.getLogger(__name__)
+
+BENCHMARKS = ("notify_users", "outbox", "expiring", "aprobar", "update_database")
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def result(ops, seconds, latencies=(), **extra):
+    latencies = list(latencies)
+    return {
+        "ops": ops,
+        "seconds": round(seconds, 4),
+        "throughput": round(ops / seconds, 2) if seconds else 0.0,
+        "p50": round(percentile(latencies, 50), 5),
+        "p95": round(percentile(latencies, 95), 5),
+        "p99": round(percentile(latencies, 99), 5),
+        "max": round(max(latencies, default=0.0), 5),
+        **extra,
+    }
+
+
+class CallRecorder:
+    """Records the latency of every Bot API call made through the shared api wrapper."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self._call = api.call
+
+    async def call(self, make_request, chat_id=None, method="call"):
+        started = time.perf_counter()
+        try:
+            return await self._call(make_request, chat_id, method)
+        finally:
+            self.latencies[method].append(time.perf_counter() - started)
+
+    def reset(self):
+        self.latencies.clear()
+
+    def all(self):
+        return [value for values in self.latencies.values() for value in values]
+
+
+class BenchMessage:
+    """The parts of telegram.Message the command handlers use; replies go to the fake API."""
+
+    def __init__(self, user_id, chat_id):
+        self.from_user = SimpleNamespace(id=user_id, first_name="Bench", last_name="", username="bench")
+        self.chat_id = chat_id
+
+    async def reply_text(self, text, **kwargs):
+        return await api.bot.send_message(chat_id=self.chat_id, text=text, **kwargs)
+
+
+def bench_update(user_id, chat_id):
+    message = BenchMessage(user_id, chat_id)
+    return SimpleNamespace(message=message, effective_user=message.from_user)
+
+
+class BenchTelethonClient:
+    """
+    Serves a synthetic channel to update_database: the given member ids,
+    in pages of 200 with `page_latency` seconds per page like iter_participants,
+    and an admin log of the joins and leaves made through join()/leave(), in
+    pages of 100 like iter_admin_log. `walks` counts iter_participants calls.
+    """
+
+    def __init__(self, member_ids, join_dates, page_latency=0.0):
+        self.member_ids = list(member_ids)
+        self.join_dates = join_dates
+        self.page_latency = page_latency
+        self.session = SimpleNamespace(save=lambda: "bench")
+        self.log = []
+        self.walks = 0
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def get_entity(self, entity):
+        return entity
+
+    def _user(self, user_id):
+        return SimpleNamespace(id=user_id, username=f"user{user_id}", first_name="Bench", last_name="")
+
+    async def iter_participants(self, channel):
+        self.walks += 1
+        for i, user_id in enumerate(self.member_ids):
+            if i % 200 == 0 and self.page_latency:
+                await asyncio.sleep(self.page_latency)
+            joined = datetime.datetime.combine(self.join_dates[user_id], datetime.time(), datetime.timezone.utc)
+            user = self._user(user_id)
+            user.participant = ChannelParticipant(user_id=user_id, date=joined)
+            yield user
+
+    async def get_participants(self, channel, limit=None):
+        if self.page_latency:
+            await asyncio.sleep(self.page_latency)
+        return SimpleNamespace(total=len(self.member_ids))
+
+    async def iter_admin_log(self, channel, limit=None, min_id=0, **filters):
+        events = [event for event in reversed(self.log) if event.id > min_id][:limit]
+        for i, event in enumerate(events):
+            if i % 100 == 0 and self.page_latency:
+                await asyncio.sleep(self.page_latency)
+            yield event
+
+    def _log(self, user_id, action):
+        self.log.append(SimpleNamespace(
+            id=len(self.log) + 1, date=datetime.datetime.now(datetime.timezone.utc), user_id=user_id,
+            action=action, entities={user_id: self._user(user_id)},
+        ))
+
+    def join(self, user_id):
+        self.member_ids.append(user_id)
+        self.join_dates[user_id] = datetime.date.today()
+        self._log(user_id, types.ChannelAdminLogEventActionParticipantJoinByRequest(invite=None, approved_by=1))
+
+    def leave(self, user_id):
+        self.member_ids.remove(user_id)
+        self._log(user_id, types.ChannelAdminLogEventActionParticipantLeave())
+
+
+class Bench:
+    def __init__(self, args, fake, recorder, workdir):
+        self.args = args
+        self.fake = fake
+        self.recorder = recorder
+        self.workdir = workdir
+        self.template = os.path.join(workdir, "template.db")
+        self.random = random.Random(args.seed)
+
+    async def fresh_db(self, name):
+        """Point the repository at a fresh copy of the generated database."""
+        await repository.close_repository()
+        repository.user_cache.clear()
+        path = os.path.join(self.workdir, f"{name}.db")
+        shutil.copy(self.template, path)
+        repository.init_repository(path)
+        self.recorder.reset()
+        self.fake.requests.clear()
+        self.fake.throttled.clear()
+        return path
+
+    def api_stats(self):
+        return {
+            "api_requests": sum(self.fake.requests.values()),
+            "api_throttled": sum(self.fake.throttled.values()),
+            "api_p50": round(percentile(self.recorder.all(), 50), 5),
+            "api_p99": round(percentile(self.recorder.all(), 99), 5),
+        }
+
+    def query(self, path, sql):
+        """Read straight from the benchmark database, outside the repository pool."""
+        with closing(sqlite3.connect(path)) as conn:
+            return conn.execute(sql).fetchall()
+
+    async def notify_users(self):
+        await self.fresh_db("notify_users")
+        due = len(await repository.list_expiring(datetime.date.today() + datetime.timedelta(days=1)))
+        started = time.perf_counter()
+        await tasks.notify_users()
+        return result(due, time.perf_counter() - started, self.recorder.latencies["banChatMember"],
+                      **self.api_stats())
+
+    async def outbox(self):
+        """Queue one reminder per user due by tomorrow, then time the outbox worker draining them."""
+        path = await self.fresh_db("outbox")
+        due = await repository.list_expiring(datetime.date.today() + datetime.timedelta(days=1))
+        await outbox.enqueue_many((user.telegram_user_id, f"Bench reminder {user.paid_until}", None) for user in due)
+        queued = len(due)
+        started = time.perf_counter()
+        outbox.outbox_worker.start()
+        try:
+            while True:
+                await asyncio.sleep(0.05)
+                if not self.query(path, "SELECT COUNT(*) FROM outbox WHERE status != 'dead'")[0][0]:
+                    break
+        finally:
+            await outbox.outbox_worker.stop()
+        return result(queued, time.perf_counter() - started, self.recorder.latencies["sendMessage"],
+                      **self.api_stats())
+
+    async def handler(self, name, callback, make_args):
+        """Run a command handler --iterations times, --concurrency at a time, as an admin."""
+        await self.fresh_db(name)
+        admin_id = min(ADMIN_IDS)
+        latencies = []
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+
+        async def one(i):
+            # A distinct chat per call so the per-chat limit does not serialise the run
+            update = bench_update(admin_id, chat_id=10_000 + i)
+            context = SimpleNamespace(args=make_args(i))
+            async with semaphore:
+                started = time.perf_counter()
+                await callback(update, context)
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(self.args.iterations)))
+        return result(self.args.iterations, time.perf_counter() - started, latencies, **self.api_stats())
+
+    async def expiring(self):
+        return await self.handler("expiring", commands.expiring, lambda i: [str(self.random.choice((1, 3, 7)))])
+
+    async def aprobar(self):
+        ids = [row[0] for row in self.query(self.template, "SELECT telegram_user_id FROM users")]
+        # Mostly renewals of existing members, some first-time approvals
+        def args(i):
+            if self.random.random() < 0.8:
+                return [str(self.random.choice(ids))]
+            return [str(2 * 10 ** 9 + i)]
+        return await self.handler("aprobar", commands.aprobar, args)
+
+    async def update_database(self):
+        """
+        A first sync (empty snapshot, everyone is new, full walk) followed by an
+        incremental one that reads 1% leaves and 1% joins from the admin log.
+        """
+        path = await self.fresh_db("update_database")
+        rows = self.query(path, "SELECT telegram_user_id, join_date FROM users ORDER BY id")
+        # 5% of members have left the channel and 5% more joined since the database was written
+        members = [user_id for user_id, _ in rows if self.random.random() >= 0.05]
+        join_dates = {user_id: datetime.date.fromisoformat(join_date) for user_id, join_date in rows}
+        today = datetime.date.today()
+        for i in range(len(rows) // 20):
+            user_id = 3 * 10 ** 9 + i
+            members.append(user_id)
+            join_dates[user_id] = today - datetime.timedelta(days=self.random.randint(0, 90))
+
+        client = BenchTelethonClient(members, join_dates, self.args.page_latency)
+        update_db._client = client
+        update_db.SESSION_STRING = update_db.SESSION_STRING or "bench"
+        runs = {}
+        for run in ("first", "incremental"):
+            if run == "incremental":
+                for user_id in self.random.sample(client.member_ids, len(client.member_ids) // 100):
+                    client.leave(user_id)
+                for i in range(len(client.member_ids) // 100):
+                    client.join(4 * 10 ** 9 + i)
+            walks = client.walks
+            started = time.perf_counter()
+            summary = await update_db.update_database(interactive=False)
+            elapsed = time.perf_counter() - started
+            mode = "full_walk" if client.walks > walks else "admin_log"
+            runs[run] = result(len(client.member_ids), elapsed, mode=mode, **summary)
+        return runs["first"] | {"incremental": runs["incremental"]}
+
+
+async def run_benchmarks(args):
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    fake = FakeBotAPI(args.latency, rate_429=args.rate_429, retry_after=args.retry_after, seed=args.seed)
+    port = await fake.start()
+    recorder = CallRecorder()
+    api.call = recorder.call
+    bench = Bench(args, fake, recorder, workdir)
+    generate(bench.template, args.users, args.distribution, args.seed)
+
+    report = {
+        "meta": {
+            "users": args.users,
+            "distribution": args.distribution,
+            "seed": args.seed,
+            "latency": args.latency,
+            "rate_429": args.rate_429,
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "date": datetime.date.today().isoformat(),
+        },
+        "results": {},
+    }
+    try:
+        async with Bot(token=os.environ["BOT_TOKEN"], base_url=fake.base_url(port), request=build_request()) as bot:
+            api.attach(bot)
+            for name in args.only:
+                logger.info(f"⏱️ Running {name}...")
+                report["results"][name] = await getattr(bench, name)()
+    finally:
+        await repository.close_repository()
+        await fake.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def print_report(report):
+    print(f"{'benchmark':<18}{'ops':>9}{'seconds':>10}{'ops/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, row in report["results"].items():
+        rows = [(name, row)] + [(f"  {key}", sub) for key, sub in row.items() if isinstance(sub, dict)]
+        for label, row in rows:
+            mode = f"  ({row['mode']})" if "mode" in row else ""
+            print(f"{label:<18}{row['ops']:>9}{row['seconds']:>10.3f}{row['throughput']:>10.1f}"
+                  f"{row['p50']:>10.4f}{row['p95']:>10.4f}{row['p99']:>10.4f}{mode}")
+
+
+def regressions(report, baseline, tolerance):
+    """Benchmarks whose throughput fell more than `tolerance` (a fraction) below the baseline."""
+    found = []
+    for name, row in report["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before and before["throughput"] and row["throughput"] < before["throughput"] * (1 - tolerance):
+            found.append(f"{name}: {row['throughput']:.1f} ops/s vs {before['throughput']:.1f} ops/s")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--distribution", choices=sorted(DISTRIBUTIONS), default="realistic")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.03, help="Fake Bot API latency per request (s)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--page-latency", type=float, default=0.05, help="Simulated MTProto latency per page (s)")
+    parser.add_argument("--iterations", type=int, default=200, help="Handler invocations for expiring/aprobar")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--only", default=",".join(BENCHMARKS))
+    parser.add_argument("--out", help="Write the JSON report here")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    args.only = [name for name in args.only.split(",") if name]
+    unknown = set(args.only) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    # Per-user log lines would dominate the timings
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    report = asyncio.run(run_benchmarks(args))
+    print_report(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(report, json.load(f), args.tolerance)
+        for line in found:
+            print(f"❌ Regression: {line}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,28 @@
-import sqlite3
+import csv
+import io
 import logging
-import datetime
-import re
-from telegram import Update
-from telegram.ext import CommandHandler, CallbackContext, ContextTypes
-from config.config import BOT_TOKEN, ADMIN_IDS, DATABASE_PATH
-from db.database import create_connection
-from config.config import ADMIN_IDS, CHANNEL_ID
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.ext import CallbackQueryHandler, CommandHandler, ContextTypes, MessageHandler, filters
+from config.config import ADMIN_IDS, CHANNEL_ID, EXPIRING_PAGE_SIZE, PAYMENT_AMOUNT, PAYMENT_CURRENCY
 from datetime import datetime, timedelta
+from bot import outbox, templates
+from bot.invites import invite_pool
+from bot.notifier import admin_notifier
+from bot.telegram_api import api
+from bot.templates import MARKDOWN_V2
+from db import repository
+from utils.helpers import SUBSCRIPTION_DAYS, format_date, from_day, parse_date, to_day
+from utils.metrics import instrument_handler
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def escape_markdown_v2(text):
-    """Escape all reserved MarkdownV2 characters properly."""
-    if not text:
-        return ""
-    return re.sub(r"([_*\[\]()~`>#+\-=|{}.!\\])", r"\\\1", text)
+# Payment CSV imports larger than this are refused
+MAX_IMPORT_BYTES = 1024 * 1024
+# Bulk approval replies list each user up to this many
+MAX_SUMMARY_LINES = 30
+# Longest extension a single imported payment may grant
+MAX_APPROVAL_DAYS = 366
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.message.from_user
@@ -26,58 +32,24 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     username = user.username or ""
 
     # Check if user already exists in the database.
-    conn = create_connection(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM users WHERE telegram_user_id = ?", (telegram_user_id,))
-    user_exists = cursor.fetchone()
-    conn.close()
+    user_exists = await repository.user_exists(telegram_user_id)
     # — If it’s an admin, send them a quick command cheat‑sheet and bail out —
     if telegram_user_id in ADMIN_IDS:
-        admin_help = (
-            "👮‍♂️ *Admin Commands*\n\n"
-            "/aprobar \\<user\\_id\\> \\- Aprueba un pago y extiende la suscripción\n"
-            "/denegar \\<user\\_id\\> \\- Rechaza un pago y elimina al usuario\n"
-            "/renovar \\- Notifica a admins que quieres renovar tu suscripción\n"
-            "/tiempoRestante \\- Comprueba días restantes de tu suscripción\n"
-            "/expiring \\<days\\> \\- Lista usuarios con suscripciones próximas a vencer\n"
-        )
-        await update.message.reply_text(admin_help, parse_mode="MarkdownV2")
+        await api.reply(update.message, templates.render("admin_help"), parse_mode=MARKDOWN_V2)
         return
     
     
     if user_exists:
         # The user is already registered: send a different message.
-        renewal_info_msg = (
-            "Ya estás registrado en nuestro sistema.\n\n"
-            "Si deseas /renovar tu suscripción o saber cuánto tiempo te queda, "
-            "puedes contactarte con el administrador o enviar el comando /tiempoRestante para verificarlo.\n\n"
-            "¡Gracias por formar parte de nuestro grupo!"
-        )
-        await update.message.reply_text(renewal_info_msg)
+        await api.reply(update.message, templates.render("already_registered"))
     else:
         # New user: send welcome message and notify admins.
-        welcome_msg = (
-            "Bienvenido al Bot de 1% aquí podrás /renovar tu suscripción para mantenerte en el grupo. "
-            "También podrás verificar el tiempo que te resta con el comando /tiempoRestante.\n\n"
-            "Si estás aquí es porque ya debes haber realizado el pago para la suscripción y en este momento "
-            "solo debes esperar que un Admin confirme que tu pago ha sido aprobado.\n\n"
-            "Una vez aprobado te enviaré un mensaje por este chat para que te unas al grupo de señales 🚀"
-        )
-        await update.message.reply_text(welcome_msg)
-
-        admin_msg = (
-            "⚠️ *Admin*, tienes una nueva verificación de pago que realizar\\.\n\n"
-            f"• *ID:* `{escape_markdown_v2(str(telegram_user_id))}`\n"
-            f"• *Username:* @{escape_markdown_v2(username)}\n"
-            f"• *Nombre y Apellido:* {escape_markdown_v2(first_name)} {escape_markdown_v2(last_name)}\n\n"
-            "El usuario está intentando unirse al grupo\\.\n\n"
-            f"Si no tienes un pago de parte de esta persona, contacta o envía el comando "
-            f"`/denegar {telegram_user_id}`\n\n"
-            f"Para aprobar al usuario y permitirle acceso usa `/aprobar {telegram_user_id}`\n"
-        )
+        await api.reply(update.message, templates.render("welcome"))
 
-        for admin_id in ADMIN_IDS:
-            await context.bot.send_message(chat_id=admin_id, text=admin_msg, parse_mode="MarkdownV2")
+        admin_msg = templates.render(
+            "admin_new_user", id=telegram_user_id, username=username, first_name=first_name, last_name=last_name
+        )
+        admin_notifier.notify(admin_msg)
 
 async def renovar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
@@ -92,125 +64,107 @@ async def renovar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     username = user.username or ""
 
     if telegram_user_id in ADMIN_IDS:
-        admin_help = (
-            "👮‍♂️ *Admin Commands*\n\n"
-            "/aprobar \\<user\\_id\\> — Aprueba un pago y extiende la suscripción\n"
-            "/denegar \\<user\\_id\\> — Rechaza un pago y elimina al usuario\n"
-            "/renovar \\- Notifica a admins que quieres renovar la suscripción\n"
-            "/tiempoRestante \\- Comprueba días restantes de tu suscripción\n"
-            "/expiring \\<days\\> \\— Lista usuarios con suscripciones próximas a vencer\n"
-        )
-        await update.message.reply_text(admin_help, parse_mode="MarkdownV2")
+        await api.reply(update.message, templates.render("admin_help"), parse_mode=MARKDOWN_V2)
         return
     
     
-    renewal_msg = (
-        "Estás intentando renovar tu suscripción.\n\n"
-        "Si ya realizaste el pago, por favor espera a que un Admin confirme que tu pago ha sido aprobado.\n\n"
-        "Una vez aprobado te enviaré un mensaje por este chat para que sepas que tu renovación está activa 🚀"
-    )
-    await update.message.reply_text(renewal_msg)
-
-    admin_msg = (
-        f"⚠️ *Admin*, tienes una nueva verificación de *renovación* de pago\\.\n\n"
-        f"• *ID:* `{escape_markdown_v2(str(telegram_user_id))}`\n"
-        f"• *Username:* @{escape_markdown_v2(username)}\n"
-        f"• *Nombre y Apellido:* {escape_markdown_v2(first_name)} {escape_markdown_v2(last_name)}\n\n"
-        "El usuario está intentando renovar su acceso\\.\n\n"
-        f"Si no tienes un pago de parte de esta persona, contacta o envía el comando "
-        f"`/denegar {telegram_user_id}`\n\n"
-        f"Para aprobar la renovación usa `/aprobar {telegram_user_id}`\n"
-    )
+    await api.reply(update.message, templates.render("renewal_request"))
 
-    for admin_id in ADMIN_IDS:
-        await context.bot.send_message(
-            chat_id=admin_id,
-            text=admin_msg,
-            parse_mode="MarkdownV2"
-        )
+    admin_msg = templates.render(
+        "admin_renewal", id=telegram_user_id, username=username, first_name=first_name, last_name=last_name
+    )
+    admin_notifier.notify(admin_msg)
 
 async def aprobar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
-    /aprobar <telegram_user_id>
-    Admin command to confirm the user (new or renewal).
+    /aprobar <telegram_user_id> [<telegram_user_id> ...]
+    Admin command to confirm one or many users (new or renewal).
       - If the user doesn't exist, create it with 30 days from now.
       - If the user exists and is still within paid_until (not expired), add 30 days.
       - If expired, reset or extend based on how long ago it expired.
+    All approvals are written in one transaction and answered with one reply.
     """
     if update.message.from_user.id not in ADMIN_IDS:
-        await update.message.reply_text("❌ No tienes permisos para aprobar pagos.")
+        await api.reply(update.message, "❌ No tienes permisos para aprobar pagos.")
         return
 
-    try:
-        user_id = int(context.args[0])
-    except (IndexError, ValueError):
-        await update.message.reply_text("⚠️ Uso incorrecto. Usa: /aprobar <telegram_user_id>")
+    user_ids, invalid = [], []
+    for arg in context.args:
+        try:
+            user_ids.append(int(arg))
+        except ValueError:
+            invalid.append(arg)
+    if not user_ids:
+        await api.reply(update.message, "⚠️ Uso incorrecto. Usa: /aprobar <telegram_user_id> [<telegram_user_id> ...]")
         return
 
-    conn = create_connection(DATABASE_PATH)
-    cursor = conn.cursor()
+    await _approve(update.message, [(user_id, SUBSCRIPTION_DAYS) for user_id in user_ids], invalid)
 
-    cursor.execute("SELECT id, paid_until FROM users WHERE telegram_user_id = ?", (user_id,))
-    row = cursor.fetchone()
+async def importar_pagos(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    A CSV document sent by an admin approves every payment in it at once.
+    One row per payment: telegram_user_id[,days]; a header row is optional
+    and days defaults to 30. Rows with days outside 1..MAX_APPROVAL_DAYS are
+    reported as invalid.
+    """
+    if update.message.from_user.id not in ADMIN_IDS:
+        return
 
-    today = datetime.now().date()
-    today_str = today.strftime('%Y-%m-%d')
-    new_paid_until_str = None
-
-    if not row:
-        # User doesn't exist: create new record with 30 days access.
-        join_date_str = today_str
-        paid_until_date = today + timedelta(days=30)
-        new_paid_until_str = paid_until_date.strftime('%Y-%m-%d')
-
-        cursor.execute("""
-            INSERT INTO users 
-                (telegram_user_id, username, first_name, last_name, join_date, paid_until, last_payment_date)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (user_id, "", "", "", join_date_str, new_paid_until_str, today_str))
-        conn.commit()
-    else:
-        db_id, paid_until_str = row
-        old_paid_until = datetime.strptime(paid_until_str, '%Y-%m-%d').date()
+    document = update.message.document
+    if document.file_size and document.file_size > MAX_IMPORT_BYTES:
+        await api.reply(update.message, f"⚠️ El archivo es demasiado grande (máximo {MAX_IMPORT_BYTES // 1024} KB).")
+        return
+    file = await api.call(lambda: document.get_file(), method="getFile")
+    data = await api.call(lambda: file.download_as_bytearray(), method="downloadFile")
 
-        if old_paid_until >= today:
-            # Still active: extend from current paid_until.
-            new_paid_until = old_paid_until + timedelta(days=30)
-        else:
-            days_expired = (today - old_paid_until).days
-            if days_expired > 30:
-                # Expired more than 30 days ago: reset from today.
-                new_paid_until = today + timedelta(days=30)
-            else:
-                # Expired within 30 days: extend from the old paid_until.
-                new_paid_until = old_paid_until + timedelta(days=30)
-
-        new_paid_until_str = new_paid_until.strftime('%Y-%m-%d')
-
-        cursor.execute("""
-            UPDATE users
-            SET paid_until = ?, last_payment_date = ?
-            WHERE id = ?
-        """, (new_paid_until_str, today_str, db_id))
-        cursor.execute("""
-            INSERT INTO payments (user_id, payment_date, paid_until)
-            VALUES (?, ?, ?)
-        """, (db_id, today_str, new_paid_until_str))
-        conn.commit()
-
-    await update.message.reply_text(
-        f"✅ Pago aprobado. El usuario {user_id} tiene acceso hasta {new_paid_until_str}."
+    approvals, invalid = [], []
+    for number, row in enumerate(csv.reader(io.StringIO(data.decode("utf-8-sig"))), start=1):
+        if not row or not row[0].strip():
+            continue
+        try:
+            days = int(row[1]) if len(row) > 1 and row[1].strip() else SUBSCRIPTION_DAYS
+            telegram_user_id = int(row[0])
+        except ValueError:
+            if number > 1:
+                invalid.append(f"fila {number}")
+            continue
+        # Zero or negative days would shorten a subscription and get the user kicked
+        if not 0 < days <= MAX_APPROVAL_DAYS:
+            invalid.append(f"fila {number}")
+            continue
+        approvals.append((telegram_user_id, days))
+    if not approvals:
+        await api.reply(update.message, "⚠️ No se encontraron pagos válidos en el archivo.")
+        return
+
+    await _approve(update.message, approvals, invalid)
+
+async def _approve(message, approvals, invalid):
+    """Apply (telegram_user_id, days) approvals in one transaction, queue the confirmations and reply once."""
+    today = datetime.now().date()
+    paid_until, joined = await repository.extend_subscriptions(approvals, today)
+
+    # Single-use links from the warm pool, only for users not in the group yet; renewals need none
+    invite_links = await invite_pool.take_many(uid for uid in paid_until if uid in joined)
+    confirmation = templates.get("payment_approved")
+    renewal = templates.get("payment_renewed")
+    await outbox.enqueue_many(
+        (user_id, confirmation.render(paid_until=new_paid_until, invite_link=invite_links[user_id])
+         if user_id in invite_links else renewal.render(paid_until=new_paid_until), None)
+        for user_id, new_paid_until in paid_until.items()
     )
 
-    try:
-        await context.bot.send_message(
-            chat_id=user_id,
-            text=f"✅ ¡Tu pago ha sido confirmado! Tienes acceso hasta {new_paid_until_str}. \n\n Por favor utiliza este link para unirte al grupo: 🔗 https://t.me/+Qei0MTdpyggzYTNh"
-        )
-    except Exception as e:
-        logger.error(f"No se pudo enviar mensaje al usuario {user_id}: {e}")
+    if len(approvals) == 1 and not invalid:
+        user_id, new_paid_until = next(iter(paid_until.items()))
+        await api.reply(message, f"✅ Pago aprobado. El usuario {user_id} tiene acceso hasta {new_paid_until}.")
+        return
 
-    conn.close()
+    lines = [f"✅ {len(approvals)} pagos aprobados para {len(paid_until)} usuarios ({len(joined)} nuevos)."]
+    if len(paid_until) <= MAX_SUMMARY_LINES:
+        lines += [f"• {user_id} → {new_paid_until}" for user_id, new_paid_until in paid_until.items()]
+    if invalid:
+        lines.append(f"⚠️ Ignorados ({len(invalid)}): {', '.join(invalid[:MAX_SUMMARY_LINES])}")
+    await api.reply(message, "\n".join(lines))
 
 async def denegar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
@@ -220,129 +174,255 @@ async def denegar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
       - Optionally removes the user from the database.
     """
     if update.message.from_user.id not in ADMIN_IDS:
-        await update.message.reply_text("❌ No tienes permisos para denegar pagos.")
+        await api.reply(update.message, "❌ No tienes permisos para denegar pagos.")
         return
 
     try:
         user_id = int(context.args[0])
     except (IndexError, ValueError):
-        await update.message.reply_text("⚠️ Uso incorrecto. Usa: /denegar <telegram_user_id>")
+        await api.reply(update.message, "⚠️ Uso incorrecto. Usa: /denegar <telegram_user_id>")
         return
 
-    conn = create_connection(DATABASE_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT id FROM users WHERE telegram_user_id = ?", (user_id,))
-    user_row = cursor.fetchone()
-
-    if user_row:
-        cursor.execute("DELETE FROM users WHERE telegram_user_id = ?", (user_id,))
-        conn.commit()
-        await update.message.reply_text(f"🚫 Usuario {user_id} ha sido denegado.")
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text="🚫 Tu pago no fue confirmado. Contacta con un administrador."
-            )
-        except Exception as e:
-            logger.error(f"No se pudo enviar mensaje al usuario {user_id}: {e}")
+    if await repository.delete_user(user_id):
+        await api.reply(update.message, f"🚫 Usuario {user_id} ha sido denegado.")
+        await outbox.enqueue(user_id, templates.render("payment_denied"))
+        await invite_pool.revoke(user_id)
     else:
-        await update.message.reply_text(f"⚠️ No se encontró al usuario con ID {user_id} en la base de datos.")
-
-    conn.close()
+        await api.reply(update.message, f"⚠️ No se encontró al usuario con ID {user_id} en la base de datos.")
 
 async def tiempo_restante(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /tiempoRestante - Check how many days left before payment is due."""
     user = update.message.from_user
     telegram_user_id = user.id
 
-    conn = create_connection(DATABASE_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT paid_until FROM users WHERE telegram_user_id = ?", (telegram_user_id,))
-    user_row = cursor.fetchone()
+    user_row = await repository.get_user(telegram_user_id)
 
     if user_row:
-        paid_until = datetime.strptime(user_row[0], '%Y-%m-%d').date()
+        paid_until = parse_date(user_row.paid_until)
         days_left = (paid_until - datetime.now().date()).days
 
         if days_left > 0:
-            await update.message.reply_text(f"🕒 Te quedan {days_left} días antes de que venza tu acceso.")
+            await api.reply(update.message, f"🕒 Te quedan {days_left} días antes de que venza tu acceso.")
         else:
-            await update.message.reply_text("🚫 Tu acceso ha expirado. Contacta con un administrador para renovarlo.")
+            await api.reply(update.message, "🚫 Tu acceso ha expirado. Contacta con un administrador para renovarlo.")
             # Make sure to use the proper chat id from update.message.chat.id
             # “Kick” = ban then unban so they can re‑join later
-            await context.bot.ban_chat_member(chat_id=CHANNEL_ID, user_id=telegram_user_id)
-            await context.bot.unban_chat_member(chat_id=CHANNEL_ID, user_id=telegram_user_id)
-            cursor.execute("DELETE FROM users WHERE telegram_user_id = ?", (telegram_user_id,))
-            conn.commit()
+            await api.kick(CHANNEL_ID, telegram_user_id)
+            await repository.delete_user(telegram_user_id)
     else:
-        await update.message.reply_text("⚠️ No estás registrado en el sistema.")
-
-    conn.close()
+        await api.reply(update.message, "⚠️ No estás registrado en el sistema.")
 
 async def expiring(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    /expiring <días> [csv]
+    Paged report of users expiring within <días>, with ⬅️/➡️ buttons.
+    With "csv" the full list is sent as a document instead.
+    """
     if update.effective_user.id not in ADMIN_IDS:
-        await update.message.reply_text("⛔ No tienes permiso para usar este comando.")
+        await api.reply(update.message, "⛔ No tienes permiso para usar este comando.")
         return
 
     # Get days argument
     try:
         days = int(context.args[0])
     except (IndexError, ValueError):
-        await update.message.reply_text("Uso: /expiring <días>")
+        await api.reply(update.message, "Uso: /expiring <días> [csv]")
         return
 
     threshold_date = (datetime.now() + timedelta(days=days)).date()
 
-    conn = create_connection(DATABASE_PATH)
-    cursor = conn.cursor()
+    if context.args[1:2] == ["csv"]:
+        await _send_expiring_csv(update.message, threshold_date)
+        return
 
-    cursor.execute("""
-        SELECT username, first_name, last_name, paid_until
-        FROM users
-        WHERE paid_until IS NOT NULL
-    """)
-    users = cursor.fetchall()
-    conn.close()
+    page = await _render_expiring_page(threshold_date, 0)
+    if page is None:
+        await api.reply(update.message, f"Ningún usuario con suscripción próxima a vencer en {days} días.")
+        return
+    text, keyboard = page
+    await api.reply(update.message, text, parse_mode=MARKDOWN_V2, reply_markup=keyboard)
+
+async def expiring_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Render the page an /expiring navigation button points at, in place."""
+    query = update.callback_query
+    if query.from_user.id not in ADMIN_IDS:
+        await api.answer_callback(query, "⛔ No tienes permiso para usar este comando.")
+        return
 
-    expiring_users = []
-    for username, first_name, last_name, paid_until_str in users:
-        try:
-            paid_until = datetime.strptime(paid_until_str, "%Y-%m-%d").date()
-            if paid_until <= threshold_date:
-                full_name = f"{first_name or ''} {last_name or ''}".strip()
-                expiring_users.append((username or 'N/A', full_name, paid_until.strftime("%Y-%m-%d")))
-        except ValueError:
-            continue  # Skip invalid dates
+    # exp:<until_day>:csv or exp:<until_day>:<total>:<page>:<n|p>:<paid_until_day>:<telegram_user_id>
+    parts = query.data.split(":")
+    threshold_date = from_day(int(parts[1]))
+    if parts[2] == "csv":
+        await api.answer_callback(query)
+        await _send_expiring_csv(query.message, threshold_date)
+        return
 
-    if not expiring_users:
-        await update.message.reply_text(f"Ningún usuario con suscripción próxima a vencer en {days} días.")
+    total, page_number, direction, key = int(parts[2]), int(parts[3]), parts[4], (int(parts[5]), int(parts[6]))
+    page = await _render_expiring_page(
+        threshold_date, page_number, total, **{"after" if direction == "n" else "before": key}
+    )
+    await api.answer_callback(query)
+    if page is None:
+        await api.edit_message_text(query, "Ningún usuario con suscripción próxima a vencer.")
         return
+    text, keyboard = page
+    await api.edit_message_text(query, text, parse_mode=MARKDOWN_V2, reply_markup=keyboard)
+
+async def _render_expiring_page(threshold_date, page_number, total=None, after=None, before=None):
+    """
+    Fetch and render one page of the report. Only that page's rows are read;
+    the cursor for each button is the key of the page's first/last row. The
+    total is counted once, for the first page, and carried in the buttons.
+    Returns (text, keyboard), or None when nobody is expiring.
+    """
+    users, more = await repository.expiring_page(threshold_date, EXPIRING_PAGE_SIZE, after=after, before=before)
+    if not users:
+        return None
+    if total is None:
+        total = await repository.count_expiring(threshold_date)
+    pages = max(1, -(-total // EXPIRING_PAGE_SIZE))
+    page_number = min(page_number, pages - 1)
+
+    line = templates.get("expiring_line")
+    msg_lines = [templates.render("expiring_header", total=total, page=page_number + 1, pages=pages)]
+    for user in users:
+        name = f"{user.first_name or ''} {user.last_name or ''}".strip()
+        msg_lines.append(line.render(
+            username=user.username or 'N/A', name=name, paid_until=format_date(from_day(user.paid_until_day))
+        ))
+
+    until_day = to_day(threshold_date)
+    first, last = users[0], users[-1]
+    has_prev = page_number > 0 and (before is None or more)
+    has_next = more if before is None else True
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton(
+            "⬅️",
+            callback_data=f"exp:{until_day}:{total}:{page_number - 1}:p:{first.paid_until_day}:{first.telegram_user_id}",
+        ))
+    if has_next:
+        buttons.append(InlineKeyboardButton(
+            "➡️",
+            callback_data=f"exp:{until_day}:{total}:{page_number + 1}:n:{last.paid_until_day}:{last.telegram_user_id}",
+        ))
+    keyboard = InlineKeyboardMarkup([buttons, [InlineKeyboardButton("📄 CSV", callback_data=f"exp:{until_day}:csv")]])
+    return "\n".join(msg_lines), keyboard
+
+async def _send_expiring_csv(message, threshold_date):
+    """Send every user expiring by threshold_date as a CSV document, read in keyset chunks."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["telegram_user_id", "username", "first_name", "last_name", "paid_until"])
+    count = 0
+    async for user in repository.iter_expiring(threshold_date):
+        writer.writerow([user.telegram_user_id, user.username or "", user.first_name or "", user.last_name or "",
+                         format_date(from_day(user.paid_until_day))])
+        count += 1
+    if not count:
+        await api.reply(message, "Ningún usuario con suscripción próxima a vencer.")
+        return
+    await api.reply_document(
+        message, buffer.getvalue().encode("utf-8"), f"expiring_{format_date(threshold_date)}.csv",
+        caption=f"📅 {count} usuarios con suscripción hasta el {format_date(threshold_date)}",
+    )
+
+async def revocar_links(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    /revocar_links [telegram_user_id]
+    Revoke the unused invite links handed to a user, or every unused link
+    (including the ready pool) when no user is given.
+    """
+    if update.message.from_user.id not in ADMIN_IDS:
+        await api.reply(update.message, "⛔ No tienes permiso para usar este comando.")
+        return
+
+    try:
+        user_id = int(context.args[0]) if context.args else None
+    except ValueError:
+        await api.reply(update.message, "⚠️ Uso incorrecto. Usa: /revocar_links [telegram_user_id]")
+        return
+
+    revoked = await invite_pool.revoke(user_id)
+    await api.reply(update.message, f"🔗 {revoked} links de invitación revocados.")
+
+def _revenue(approved_days):
+    """Revenue of `approved_days` subscription days at PAYMENT_AMOUNT per SUBSCRIPTION_DAYS."""
+    return round(approved_days * PAYMENT_AMOUNT / SUBSCRIPTION_DAYS, 2)
+
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    /stats [csv]
+    Member count and today's, this month's and the last 30 days' joins,
+    renewals, removals and revenue, read from the maintained aggregates.
+    With "csv" every daily rollup is sent as a document instead.
+    """
+    if update.message.from_user.id not in ADMIN_IDS:
+        await api.reply(update.message, "⛔ No tienes permiso para usar este comando.")
+        return
+
+    if context.args[:1] == ["csv"]:
+        await _send_stats_csv(update.message)
+        return
+
+    today = datetime.now().date()
+    window_start = today - timedelta(days=29)
+    result = await repository.get_stats(
+        today, {"Hoy": today, "Este mes": today.replace(day=1), "Últimos 30 días": window_start}
+    )
+
+    msg_lines = [templates.render(
+        "stats_header", members=result["members"], active=result["members"] - result["expired"],
+        expired=result["expired"],
+    )]
+    period = templates.get("stats_period")
+    revenue = templates.get("stats_revenue")
+    for label, totals in result["periods"].items():
+        msg_lines.append(period.render(label=label, **totals))
+        if PAYMENT_AMOUNT:
+            msg_lines.append(revenue.render(revenue=_revenue(totals["approved_days"]), currency=PAYMENT_CURRENCY))
+
+    # Removals over the members there were when the window opened
+    window = result["periods"]["Últimos 30 días"]
+    members_before = result["members"] - window["new_members"] - window["restored"] + window["removals"]
+    churn = round(100 * window["removals"] / members_before, 1) if members_before > 0 else 0
+    msg_lines.append("")
+    msg_lines.append(templates.render("stats_churn", churn=churn))
+    await api.reply(update.message, "\n".join(msg_lines), parse_mode=MARKDOWN_V2)
+
+async def _send_stats_csv(message):
+    """Send the stats_daily rollups, one row per day, as a CSV document."""
+    rows = await repository.get_daily_stats()
+    if not rows:
+        await api.reply(message, "Todavía no hay estadísticas.")
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["day", *repository.STATS_COLUMNS, "revenue"])
+    approved_days = repository.STATS_COLUMNS.index("approved_days") + 1
+    for row in rows:
+        writer.writerow([*row, _revenue(row[approved_days])])
+    await api.reply_document(
+        message, buffer.getvalue().encode("utf-8"), f"stats_{format_date(datetime.now().date())}.csv",
+        caption=f"📊 {len(rows)} días de estadísticas",
+    )
 
-    msg_lines = [f"📅 *Suscripciones por vencer:* {len(expiring_users)} usuarios\n"]
-    for uname, name, date in expiring_users:
-        line = f"• @{escape_markdown_v2(uname)} \\| {escape_markdown_v2(name)} \\| `{date}`"
-        msg_lines.append(line)
-
-    result = "\n".join(msg_lines)
-    chunk = ""
-    for line in msg_lines:
-        if len(chunk) + len(line) + 1 > 4000:  # Keeping a bit of buffer
-            await update.message.reply_text(chunk, parse_mode="MarkdownV2")
-            chunk = ""
-        chunk += line + "\n"
-
-    if chunk:
-        await update.message.reply_text(chunk, parse_mode="MarkdownV2")
-    
 def get_handlers():
     """Return all bot command handlers for integration in main.py"""
-    return [
-        CommandHandler("start", start),
-        CommandHandler("renovar", renovar),
-        CommandHandler("aprobar", aprobar),
-        CommandHandler("denegar", denegar),
-        CommandHandler("tiempoRestante", tiempo_restante),
-        CommandHandler("expiring", expiring)
-    ]
\ No newline at end of file
+    commands = [
+        ("start", start),
+        ("renovar", renovar),
+        ("aprobar", aprobar),
+        ("denegar", denegar),
+        ("tiempoRestante", tiempo_restante),
+        ("expiring", expiring),
+        ("revocar_links", revocar_links),
+        ("stats", stats),
+    ]
+    handlers = [CommandHandler(name, instrument_handler(name, callback)) for name, callback in commands]
+    handlers.append(CallbackQueryHandler(instrument_handler("expiring_page", expiring_page), pattern=r"^exp:"))
+    handlers.append(MessageHandler(
+        filters.Document.FileExtension("csv") & filters.User(list(ADMIN_IDS)),
+        instrument_handler("importar_pagos", importar_pagos),
+    ))
+    return handlers
\ No newline at end of file
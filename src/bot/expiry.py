@@ -0,0 +1,153 @@
+# bot/expiry.py
+
+import asyncio
+import datetime
+import heapq
+import logging
+import time
+
+from config.config import EXPIRY_HORIZON_DAYS, EXPIRY_KICK_TIME, NOTIFY_TIME
+from cron.tasks import remind_users
+from db import repository
+from utils.helpers import from_day
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_time(value: str) -> datetime.time:
+    hour, minute = map(int, value.split(":"))
+    return datetime.time(hour, minute)
+
+
+def _timestamp(day: datetime.date, at: datetime.time) -> float:
+    """Epoch seconds of `at` local time on `day`."""
+    return datetime.datetime.combine(day, at).timestamp()
+
+
+class ExpiryScheduler:
+    """
+    Fires reminders and removals when each user's deadline passes, instead
+    of waiting for the next notify_users run.
+
+    Every user expiring within `horizon_days` gets up to three deadlines on a
+    min-heap of (due time, telegram_user_id, paid_until_day): the tomorrow
+    reminder and the today reminder at NOTIFY_TIME, and the removal at
+    EXPIRY_KICK_TIME the day after paid_until. They are loaded with a range
+    query on paid_until_day, extended a day at a time as the horizon moves,
+    and kept current by the repository's change listeners (/aprobar,
+    /denegar, removals, the participant sync). Entries for a paid_until_day
+    that is no longer current are dropped when they surface.
+
+    Due users are handed to cron.tasks.remind_users, which checks the
+    notifications log, so a deadline fired twice sends nothing new. The
+    notify_users job stays as the backstop for failed kicks and for writes
+    made by other processes.
+    """
+
+    def __init__(self, horizon_days: int = EXPIRY_HORIZON_DAYS, remind_at: str = NOTIFY_TIME,
+                 kick_at: str = EXPIRY_KICK_TIME):
+        self.horizon_days = horizon_days
+        self.remind_at = _parse_time(remind_at)
+        self.kick_at = _parse_time(kick_at)
+        self._heap = []
+        self._days = {}
+        self._horizon = None
+        self._pending = None
+        self._wake = asyncio.Event()
+        self._task = None
+
+    async def start(self) -> None:
+        if not self.horizon_days:
+            return
+        repository.add_change_listener(self.apply)
+        await self._load(datetime.date.today() + datetime.timedelta(days=self.horizon_days))
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"⏰ Expiry scheduler loaded {len(self._days)} users ({len(self._heap)} deadlines)")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        repository.remove_change_listener(self.apply)
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    async def _load(self, horizon: datetime.date) -> None:
+        # Only the users newly inside the horizon; changes published meanwhile are newer, replay them on top
+        previous = from_day(self._horizon) if self._horizon is not None else None
+        self._pending = {}
+        try:
+            loaded = await repository.get_paid_until_days_between(previous, horizon)
+        finally:
+            pending, self._pending = self._pending, None
+        self._horizon = horizon.toordinal()
+        for uid, day in loaded.items():
+            self._schedule(uid, day)
+        self.apply(pending)
+
+    def apply(self, changes) -> None:
+        if self._pending is not None:
+            self._pending.update(changes)
+        if self._horizon is None:
+            return
+        for uid, day in changes.items():
+            if day is None or day > self._horizon:
+                self._days.pop(uid, None)
+            elif self._days.get(uid) != day:
+                self._schedule(uid, day)
+        self._wake.set()
+
+    def _schedule(self, uid: int, day: int) -> None:
+        self._days[uid] = day
+        paid_until = from_day(day)
+        day_before = paid_until - datetime.timedelta(days=1)
+        day_after = paid_until + datetime.timedelta(days=1)
+        midnight = datetime.time()
+        # (due, end of the day it belongs to): a reminder missed on its day is left to notify_users
+        deadlines = [
+            (_timestamp(day_before, self.remind_at), _timestamp(paid_until, midnight)),
+            (_timestamp(paid_until, self.remind_at), _timestamp(day_after, midnight)),
+            (_timestamp(day_after, self.kick_at), None),
+        ]
+        now = time.time()
+        for due, ends in deadlines:
+            if ends is None or ends > now:
+                heapq.heappush(self._heap, (due, uid, day))
+
+    def _pop_due(self, now: float) -> list:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, uid, day = heapq.heappop(self._heap)
+            if self._days.get(uid) == day:
+                due.append(uid)
+        return due
+
+    async def _run(self):
+        while True:
+            try:
+                horizon = datetime.date.today() + datetime.timedelta(days=self.horizon_days)
+                if horizon.toordinal() > self._horizon:
+                    await self._load(horizon)
+                due = self._pop_due(time.time())
+                if due:
+                    await remind_users(due)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Expiry scheduler failed: {e}")
+            # Sleep until the next deadline, waking at midnight to move the horizon
+            tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+            wake_at = _timestamp(tomorrow, datetime.time())
+            if self._heap:
+                wake_at = min(wake_at, self._heap[0][0])
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(wake_at - time.time(), 0))
+            except asyncio.TimeoutError:
+                pass
+
+
+expiry_scheduler = ExpiryScheduler()
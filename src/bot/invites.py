@@ -0,0 +1,153 @@
+# bot/invites.py
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+from config.config import (
+    CHANNEL_ID,
+    INVITE_LINK,
+    INVITE_LINK_TTL_HOURS,
+    INVITE_POOL_SIZE,
+    INVITE_REFILL_INTERVAL,
+)
+from bot.telegram_api import api
+from db import repository
+
+logger = logging.getLogger(__name__)
+
+# A link handed out must stay valid at least this long
+MIN_LINK_VALIDITY = 3600
+
+
+class InviteLinkPool:
+    """
+    A warm buffer of single-use, expiring invite links for approvals.
+
+    take() hands out the oldest ready link from an in-memory deque and
+    records which telegram_user_id got it; it never calls the Bot API. A
+    background task tops the pool back up to `size` when it drops below
+    half, and retires links that are about to expire. When the pool is
+    empty (or disabled with size 0) take() falls back to INVITE_LINK.
+    """
+
+    def __init__(self, size: int = INVITE_POOL_SIZE, ttl_hours: float = INVITE_LINK_TTL_HOURS,
+                 refill_interval: float = INVITE_REFILL_INTERVAL):
+        self.size = size
+        self.ttl = ttl_hours * 3600
+        self.refill_interval = refill_interval
+        self._links = deque()
+        self._wake = asyncio.Event()
+        self._task = None
+
+    async def start(self) -> None:
+        if not self.size:
+            return
+        self._links.extend(await repository.available_invite_links(time.time() + MIN_LINK_VALIDITY))
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"🔗 Invite link pool loaded with {len(self._links)} links")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def __len__(self):
+        return len(self._links)
+
+    async def take(self, telegram_user_id: int) -> str:
+        """A single-use link for telegram_user_id, or the shared INVITE_LINK if none is ready."""
+        return (await self.take_many([telegram_user_id]))[telegram_user_id]
+
+    async def take_many(self, user_ids) -> dict:
+        """
+        {telegram_user_id: link} for each user, recorded in one write. Users
+        left over once the pool runs dry get the shared INVITE_LINK.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        valid_after = time.time() + MIN_LINK_VALIDITY
+        links = {}
+        for telegram_user_id in user_ids:
+            while self._links:
+                link, expires_at = self._links.popleft()
+                if expires_at > valid_after:
+                    links[telegram_user_id] = link
+                    break
+            else:
+                break
+        if self.size and len(self._links) < self.size // 2:
+            self._wake.set()
+        if links:
+            await repository.assign_invite_links([(link, uid) for uid, link in links.items()], time.time())
+        missing = [uid for uid in user_ids if uid not in links]
+        if missing and self.size:
+            logger.warning(f"⚠️ Invite link pool is empty, sending the shared link to {len(missing)} users")
+        return {uid: links.get(uid, INVITE_LINK) for uid in user_ids}
+
+    async def record_join(self, invite_link: str, telegram_user_id: int) -> None:
+        """
+        Match a join back to the user the link was handed to. A link used by
+        someone else was leaked; it is single-use, so it is spent already.
+        """
+        assigned_to = await repository.use_invite_link(invite_link, telegram_user_id, time.time())
+        if assigned_to is not None and assigned_to != telegram_user_id:
+            logger.warning(f"⚠️ Invite link given to {assigned_to} was used by {telegram_user_id}")
+
+    async def revoke(self, telegram_user_id: int = None) -> int:
+        """
+        Revoke the unused links handed to telegram_user_id, or every unused
+        link (the warm pool included) when None. Returns how many were revoked.
+        """
+        links = await repository.revocable_invite_links(telegram_user_id)
+        if telegram_user_id is None:
+            self._links.clear()
+            self._wake.set()
+        revoked = []
+        for link in links:
+            try:
+                await api.revoke_chat_invite_link(CHANNEL_ID, link)
+            except Exception as e:
+                logger.error(f"❌ Could not revoke invite link {link}: {e}")
+                continue
+            revoked.append(link)
+        if revoked:
+            await repository.mark_invite_links_revoked(revoked)
+        return len(revoked)
+
+    async def _run(self):
+        while True:
+            try:
+                await self._refill()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Invite link refill failed: {e}")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refill(self):
+        valid_after = time.time() + MIN_LINK_VALIDITY
+        while self._links and self._links[0][1] <= valid_after:
+            self._links.popleft()
+        if len(self._links) >= self.size // 2 and self._links:
+            return
+        created = []
+        try:
+            while len(self._links) + len(created) < self.size:
+                expires_at = int(time.time() + self.ttl)
+                invite = await api.create_chat_invite_link(CHANNEL_ID, member_limit=1, expire_date=expires_at)
+                created.append((invite.invite_link, expires_at))
+        finally:
+            if created:
+                await repository.add_invite_links(created, time.time())
+                self._links.extend(created)
+                logger.info(f"🔗 Created {len(created)} invite links ({len(self._links)} ready)")
+
+
+invite_pool = InviteLinkPool()
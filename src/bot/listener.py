@@ -1,52 +1,87 @@
 import datetime
 import logging
-from telegram import Update
-from telegram.ext import MessageHandler, CallbackContext, filters
-from db.database import create_connection
-from config.config import DATABASE_PATH
+from telegram import ChatMember, Update
+from telegram.ext import ChatJoinRequestHandler, ChatMemberHandler, MessageHandler, ContextTypes, filters
+from config.config import CHANNEL_ID
+from bot import outbox, templates
+from bot.invites import invite_pool
+from bot.subscribers import subscribers
+from bot.telegram_api import api
+from db import repository
+from db.batch import WriteBatcher
+from utils.helpers import parse_date
+from utils.metrics import JOIN_REQUESTS, instrument_handler
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def register_new_user(update: Update, context: CallbackContext) -> None:
+async def register_new_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handles new users joining the group and registers them in the database."""
-    for member in update.message.new_chat_members:
-        telegram_user_id = member.id
-        first_name = member.first_name or ""
-        last_name = member.last_name or ""
-        username = member.username or ""
-
-        conn = create_connection(DATABASE_PATH)
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT id, paid_until FROM users WHERE telegram_user_id = ?", (telegram_user_id,))
-        existing_user = cursor.fetchone()
-
-        if not existing_user:
-            join_date = datetime.datetime.now().strftime('%Y-%m-%d')
-            paid_until = (datetime.datetime.now() + datetime.timedelta(days=30)).strftime('%Y-%m-%d')
-
-            cursor.execute("""
-                INSERT INTO users (telegram_user_id, username, first_name, last_name, join_date, paid_until, last_payment_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (telegram_user_id, username, first_name, last_name, join_date, paid_until, join_date))
-            
-            conn.commit()
-            logger.info(f"✅ New user registered: {first_name} (@{username}), access valid until {paid_until}")
-        else:
-            paid_until = datetime.datetime.strptime(existing_user[1], '%Y-%m-%d')
-            if datetime.datetime.now() > paid_until:
-                update.message.reply_text("🚫 Tu acceso ha expirado. Contacta con un administrador para renovarlo.")
-                context.bot.ban_chat_member(chat_id=update.message.chat.id, user_id=telegram_user_id)
-                context.bot.unban_chat_member(chat_id=update.message.chat.id, user_id=telegram_user_id)            
-                cursor.execute("DELETE FROM users WHERE telegram_user_id = ?", (telegram_user_id,))
-
-                cursor.execute("DELETE FROM users WHERE telegram_user_id = ?", (telegram_user_id,))
-                conn.commit()
-                logger.info(f"🚨 User {first_name} (@{username}) was kicked for overdue payment.")
-
-        conn.close()
+    async with WriteBatcher() as batcher:
+        for member in update.message.new_chat_members:
+            await _handle_new_member(update, context, member, batcher)
+
+async def _handle_new_member(update: Update, context: ContextTypes.DEFAULT_TYPE, member, batcher: WriteBatcher) -> None:
+    """Register one new member, or kick them if their subscription has expired."""
+    telegram_user_id = member.id
+    first_name = member.first_name or ""
+    last_name = member.last_name or ""
+    username = member.username or ""
+
+    existing_user = await repository.get_user(telegram_user_id)
+
+    if not existing_user:
+        join_date = datetime.datetime.now().strftime('%Y-%m-%d')
+        paid_until = (datetime.datetime.now() + datetime.timedelta(days=30)).strftime('%Y-%m-%d')
+
+        await repository.add_user(telegram_user_id, username, first_name, last_name, join_date, paid_until)
+        logger.info(f"✅ New user registered: {first_name} (@{username}), access valid until {paid_until}")
+    else:
+        paid_until = parse_date(existing_user.paid_until)
+        if datetime.date.today() >= paid_until:
+            await api.reply(update.message, "🚫 Tu acceso ha expirado. Contacta con un administrador para renovarlo.")
+            await api.kick(update.message.chat.id, telegram_user_id)
+            await batcher.delete_user(telegram_user_id)
+            logger.info(f"🚨 User {first_name} (@{username}) was kicked for overdue payment.")
+
+async def track_invite_join(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Match channel joins through one of our single-use invite links back to the approved user."""
+    change = update.chat_member
+    if change.chat.id != CHANNEL_ID or change.invite_link is None:
+        return
+    was_member = change.old_chat_member.status in (ChatMember.MEMBER, ChatMember.ADMINISTRATOR, ChatMember.OWNER)
+    is_member = change.new_chat_member.status == ChatMember.MEMBER
+    if is_member and not was_member:
+        await invite_pool.record_join(change.invite_link.invite_link, change.new_chat_member.user.id)
+
+async def handle_join_request(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Approve join requests from users with an active subscription and decline
+    the rest, deciding from the in-memory subscriber index. Only links
+    created with "approve new members" produce join requests.
+    """
+    request = update.chat_join_request
+    if request.chat.id != CHANNEL_ID:
+        return
+    telegram_user_id = request.from_user.id
+    if subscribers.is_active(telegram_user_id):
+        await api.approve_chat_join_request(CHANNEL_ID, telegram_user_id)
+        JOIN_REQUESTS.inc("approved")
+        logger.info(f"✅ Join request approved for {telegram_user_id}")
+    else:
+        await api.decline_chat_join_request(CHANNEL_ID, telegram_user_id)
+        JOIN_REQUESTS.inc("declined")
+        # The bot may message someone who asked to join, even if they never started it
+        await outbox.enqueue(request.user_chat_id, templates.render("join_declined"))
+        logger.info(f"🚫 Join request declined for {telegram_user_id}")
+
+def get_chat_member_handlers():
+    """Channel membership changes and join requests; the bot must be a channel admin."""
+    return [
+        ChatMemberHandler(instrument_handler("chat_member", track_invite_join), ChatMemberHandler.CHAT_MEMBER),
+        ChatJoinRequestHandler(instrument_handler("chat_join_request", handle_join_request)),
+    ]
 
 def get_listeners():
     """Return event handlers for integration in main.py"""
-    return [MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, register_new_user)]
\ No newline at end of file
+    return [MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, instrument_handler("new_chat_members", register_new_user))]
\ No newline at end of file
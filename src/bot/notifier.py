@@ -0,0 +1,104 @@
+# bot/notifier.py
+
+import asyncio
+import logging
+
+from bot import outbox
+from bot.templates import MARKDOWN_V2
+from config.config import ADMIN_DIGEST_WINDOW, ADMIN_IDS
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4000
+DIGEST_SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+
+
+class AdminNotifier:
+    """
+    Background fan-out of MarkdownV2 notifications to every admin.
+
+    notify() only enqueues, so handlers return right away. A single worker
+    hands each notification to the outbox once per admin, where the outbox
+    workers deliver them concurrently. With a digest window
+    (seconds > 0) the worker waits that long after the first pending
+    notification and coalesces everything queued meanwhile into one message
+    per admin.
+    """
+
+    def __init__(self, admin_ids=ADMIN_IDS, digest_window: float = ADMIN_DIGEST_WINDOW):
+        self.admin_ids = admin_ids
+        self.digest_window = digest_window
+        self._queue = asyncio.Queue()
+        self._task = None
+        self._batch = []
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the worker, handing whatever is still queued to the outbox."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        pending = self._batch + self._drain()
+        self._batch = []
+        if pending:
+            await self._send(pending)
+
+    def notify(self, text: str) -> None:
+        """Queue a MarkdownV2 message for every admin."""
+        self._queue.put_nowait(text)
+
+    def _drain(self):
+        items = []
+        while not self._queue.empty():
+            items.append(self._queue.get_nowait())
+        return items
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._batch.append(await self._queue.get())
+            if self.digest_window > 0:
+                deadline = loop.time() + self.digest_window
+                while (remaining := deadline - loop.time()) > 0:
+                    try:
+                        self._batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            batch, self._batch = self._batch, []
+            try:
+                await self._send(batch)
+            except Exception as e:
+                logger.error(f"❌ Admin notification failed: {e}")
+
+    def _render(self, batch):
+        """Join notifications into messages that fit Telegram's length limit."""
+        if len(batch) == 1:
+            return batch
+        header = f"📬 *{len(batch)} notificaciones pendientes*"
+        messages = []
+        current = header
+        for text in batch:
+            if len(current) + len(DIGEST_SEPARATOR) + len(text) > MAX_MESSAGE_LENGTH:
+                messages.append(current)
+                current = text
+            else:
+                current += DIGEST_SEPARATOR + text
+        messages.append(current)
+        return messages
+
+    async def _send(self, batch):
+        await outbox.enqueue_many(
+            (admin_id, text, MARKDOWN_V2)
+            for text in self._render(batch)
+            for admin_id in self.admin_ids
+        )
+
+
+admin_notifier = AdminNotifier()
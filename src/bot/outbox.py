@@ -0,0 +1,185 @@
+# bot/outbox.py
+
+import asyncio
+import logging
+import time
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+from config.config import (
+    OUTBOX_BACKOFF_BASE,
+    OUTBOX_BACKOFF_MAX,
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_POLL_INTERVAL,
+    OUTBOX_WORKERS,
+)
+from bot.telegram_api import api, retry_after_seconds
+from db import repository
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxWorker:
+    """
+    Drains the outbox table with a pool of sender tasks.
+
+    A poller claims due messages whenever fewer than batch_size are in flight
+    and hands them to the senders, so one slow send never holds up the rest.
+    Results are written by a flusher as they come in, each flush in one
+    transaction: sent messages are deleted, failures are rescheduled with
+    exponential backoff, and permanent errors or too many attempts move a
+    message to 'dead'. Messages left in flight by a crash are picked up again
+    on the next start.
+    """
+
+    def __init__(self, workers: int = OUTBOX_WORKERS, batch_size: int = OUTBOX_BATCH_SIZE):
+        self.workers = workers
+        self.batch_size = batch_size
+        self._tasks = []
+        self._queue = asyncio.Queue()
+        self._wake = asyncio.Event()
+        self._room = asyncio.Event()
+        self._done = asyncio.Event()
+        self._in_flight = 0
+        self._results = ([], [], [])
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._poll()), asyncio.create_task(self._flush_loop())]
+        self._tasks += [asyncio.create_task(self._send_loop()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        try:
+            await self._flush()
+        except Exception as e:
+            logger.error(f"❌ Outbox flush error: {e}")
+        await repository.reset_outbox_in_flight()
+
+    def wake(self) -> None:
+        """Tell the poller new messages are waiting."""
+        self._wake.set()
+
+    async def _poll(self):
+        reset = await repository.reset_outbox_in_flight()
+        if reset:
+            logger.info(f"📤 Requeued {reset} outbox messages left in flight")
+        while True:
+            try:
+                room = self.batch_size - self._in_flight
+                if room <= 0:
+                    self._room.clear()
+                    await self._room.wait()
+                    continue
+                messages = await repository.claim_outbox(time.time(), room)
+                self._in_flight += len(messages)
+                for message in messages:
+                    self._queue.put_nowait(message)
+                if len(messages) < room:
+                    await self._sleep_until_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Outbox poller error: {e}")
+                await asyncio.sleep(OUTBOX_POLL_INTERVAL)
+
+    async def _sleep_until_due(self):
+        timeout = OUTBOX_POLL_INTERVAL
+        next_due = await repository.next_outbox_due()
+        if next_due is not None:
+            timeout = max(0.0, min(timeout, next_due - time.time()))
+        self._wake.clear()
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _flush_loop(self):
+        while True:
+            await self._done.wait()
+            self._done.clear()
+            try:
+                await self._flush()
+            except Exception as e:
+                logger.error(f"❌ Outbox flush error: {e}")
+                self._done.set()
+                await asyncio.sleep(OUTBOX_POLL_INTERVAL)
+
+    async def _flush(self):
+        """Write the results collected since the last flush."""
+        sent, retries, dead = self._results
+        if not (sent or retries or dead):
+            return
+        self._results = ([], [], [])
+        try:
+            await repository.finish_outbox(sent, retries, dead)
+        except Exception:
+            # Keep them for the next flush
+            for pending, results in zip(self._results, (sent, retries, dead)):
+                pending[:0] = results
+            raise
+        if retries or dead:
+            logger.info(f"📤 Outbox flush: {len(sent)} sent, {len(retries)} retrying, {len(dead)} dead")
+            # A retry may now be the earliest due message
+            self.wake()
+
+    async def _send_loop(self):
+        while True:
+            message = await self._queue.get()
+            try:
+                await self._send(message)
+            finally:
+                self._in_flight -= 1
+                self._room.set()
+                self._done.set()
+
+    async def _send(self, message):
+        # Results go to whichever lists are current once the send returns;
+        # the flusher may have swapped them while it was in progress.
+        try:
+            await api.send_message(message.chat_id, message.text, parse_mode=message.parse_mode)
+        except RetryAfter as e:
+            # Flood waits count toward OUTBOX_MAX_ATTEMPTS too, or a throttled chat is retried forever
+            self._retry(message, retry_after_seconds(e), e)
+        except (Forbidden, BadRequest) as e:
+            # Blocked bot, unknown chat or malformed text: retrying will not help
+            logger.error(f"No se pudo enviar mensaje al usuario {message.chat_id}: {e}")
+            self._results[2].append((message.id, str(e)))
+        except Exception as e:
+            self._retry(message, min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** message.attempts), e)
+        else:
+            self._results[0].append(message.id)
+
+    def _retry(self, message, delay, error):
+        """Reschedule a failed message in `delay` seconds, or dead-letter it once out of attempts."""
+        if message.attempts + 1 >= OUTBOX_MAX_ATTEMPTS:
+            logger.error(f"No se pudo enviar mensaje al usuario {message.chat_id}: {error}")
+            self._results[2].append((message.id, str(error)))
+        else:
+            self._results[1].append((message.id, time.time() + delay, str(error)))
+
+
+outbox_worker = OutboxWorker()
+
+
+async def enqueue_many(messages) -> None:
+    """Durably queue (chat_id, text, parse_mode) messages for delivery."""
+    await repository.enqueue_messages(list(messages), time.time())
+    outbox_worker.wake()
+
+
+async def enqueue_notifications(notifications) -> None:
+    """
+    Durably queue (chat_id, text, parse_mode, kind, paid_until_day) reminders,
+    logging them in the notifications table in the same transaction.
+    """
+    await repository.enqueue_notifications(list(notifications), time.time())
+    outbox_worker.wake()
+
+
+async def enqueue(chat_id: int, text: str, parse_mode: str = None) -> None:
+    """Durably queue one message for delivery."""
+    await enqueue_many([(chat_id, text, parse_mode)])
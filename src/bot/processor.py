@@ -0,0 +1,87 @@
+# bot/processor.py
+
+import asyncio
+from contextlib import asynccontextmanager
+
+from telegram.ext import BaseUpdateProcessor
+
+
+def update_keys(update) -> list:
+    """
+    The telegram_user_ids an update acts for or on: its sender, any numeric
+    command arguments (/aprobar 123, /denegar 123) and members joining.
+    """
+    keys = set()
+    if update.effective_user:
+        keys.add(update.effective_user.id)
+    message = update.effective_message
+    if message is not None:
+        if message.text and message.text.startswith("/"):
+            for arg in message.text.split()[1:]:
+                try:
+                    keys.add(int(arg))
+                except ValueError:
+                    pass
+        for member in message.new_chat_members or ():
+            keys.add(member.id)
+    if update.chat_member:
+        keys.add(update.chat_member.new_chat_member.user.id)
+    if update.chat_join_request:
+        keys.add(update.chat_join_request.from_user.id)
+    return sorted(keys)
+
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Processes up to `max_concurrent_updates` updates at once, but updates that
+    share a key from update_keys() run one after another in arrival order.
+    So /aprobar and /denegar for the same user never interleave, while
+    unrelated users are served in parallel.
+
+    Each update registers itself as the new tail of every key it touches when
+    it arrives and waits for the previous tails to finish. Waits only point
+    at earlier arrivals, so updates with several keys cannot deadlock.
+
+    The base class takes its semaphore in process_update(), before
+    do_process_update(), so an update queued behind its key would hold a
+    slot while it waits. process_update() is therefore overridden to skip it
+    and the limit is taken only after the wait: a burst from one user never
+    blocks anyone else.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._tails = {}
+
+    @asynccontextmanager
+    async def _hold(self, keys):
+        done = asyncio.Event()
+        previous = []
+        for key in keys:
+            tail = self._tails.get(key)
+            if tail is not None:
+                previous.append(tail)
+            self._tails[key] = done
+        try:
+            for tail in previous:
+                await tail.wait()
+            yield
+        finally:
+            done.set()
+            for key in keys:
+                if self._tails.get(key) is done:
+                    del self._tails[key]
+
+    async def process_update(self, update, coroutine) -> None:
+        await self.do_process_update(update, coroutine)
+
+    async def do_process_update(self, update, coroutine) -> None:
+        async with self._hold(update_keys(update)), self._slots:
+            await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,29 @@
+"""
+POST recorded update JSON files to the local webhook server.
+Run from src/ with: python -m bot.replay_update update1.json [update2.json ...]
+"""
+import sys
+import urllib.error
+import urllib.request
+
+from config.config import WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET
+
+
+def replay(path, url):
+    with open(path, "rb") as f:
+        body = f.read()
+    request = urllib.request.Request(url, data=body, method="POST")
+    request.add_header("Content-Type", "application/json")
+    if WEBHOOK_SECRET:
+        request.add_header("X-Telegram-Bot-Api-Secret-Token", WEBHOOK_SECRET)
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+if __name__ == "__main__":
+    url = f"http://127.0.0.1:{WEBHOOK_PORT}/{WEBHOOK_PATH.strip('/')}"
+    for path in sys.argv[1:]:
+        print(f"{path}: {replay(path, url)}")
@@ -0,0 +1,68 @@
+# bot/subscribers.py
+
+import logging
+from datetime import date
+
+from db import repository
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriberIndex:
+    """
+    In-memory {telegram_user_id: paid_until_day} of every user, so join
+    requests can be decided without a database round-trip.
+
+    Loaded once at startup, then kept current by the repository's change
+    listeners: /aprobar, /denegar, expiry removals and the participant sync
+    all publish their writes. Writes made by other processes are picked up
+    by reload(), which runs periodically.
+    """
+
+    def __init__(self):
+        self._paid_until = {}
+        self._pending = None
+
+    async def start(self) -> None:
+        repository.add_change_listener(self.apply)
+        await self.reload()
+
+    def stop(self) -> None:
+        repository.remove_change_listener(self.apply)
+
+    async def reload(self) -> None:
+        # Changes published while the snapshot loads are newer than it; replay them on top
+        self._pending = {}
+        try:
+            snapshot = await repository.get_paid_until_days()
+        except Exception:
+            self._pending = None
+            raise
+        paid_until = {uid: day for uid, day in snapshot.items() if day is not None}
+        pending, self._pending = self._pending, None
+        self._paid_until = paid_until
+        self.apply(pending)
+        logger.info(f"👥 Subscriber index loaded: {len(self._paid_until)} users")
+
+    def apply(self, changes) -> None:
+        if self._pending is not None:
+            self._pending.update(changes)
+        for uid, day in changes.items():
+            if day is None:
+                self._paid_until.pop(uid, None)
+            else:
+                self._paid_until[uid] = day
+
+    def paid_until_day(self, telegram_user_id: int):
+        return self._paid_until.get(telegram_user_id)
+
+    def is_active(self, telegram_user_id: int, today: date = None) -> bool:
+        """True while paid_until is today or later."""
+        day = self._paid_until.get(telegram_user_id)
+        return day is not None and day >= (today or date.today()).toordinal()
+
+    def __len__(self):
+        return len(self._paid_until)
+
+
+subscribers = SubscriberIndex()
@@ -0,0 +1,149 @@
+# bot/telegram_api.py
+
+import asyncio
+import logging
+from datetime import timedelta
+
+from telegram.error import RetryAfter
+from telegram.request import HTTPXRequest
+
+from config.config import (
+    TELEGRAM_CONNECTION_POOL_SIZE,
+    TELEGRAM_GLOBAL_RATE,
+    TELEGRAM_MAX_IN_FLIGHT,
+    TELEGRAM_MAX_RETRIES,
+    TELEGRAM_PER_CHAT_RATE,
+    TELEGRAM_TIMEOUT,
+)
+from utils.metrics import TELEGRAM_CALL_DURATION, TELEGRAM_CALL_ERRORS, TELEGRAM_RETRIES
+from utils.ratelimit import KeyedRateLimiter, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """RetryAfter.retry_after is an int in older python-telegram-bot releases and a timedelta in newer ones."""
+    value = error.retry_after
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return float(value)
+
+
+def build_request() -> HTTPXRequest:
+    """The tuned HTTP connection pool shared by the bot, the jobs and the outbox."""
+    return HTTPXRequest(
+        connection_pool_size=TELEGRAM_CONNECTION_POOL_SIZE,
+        read_timeout=TELEGRAM_TIMEOUT,
+        write_timeout=TELEGRAM_TIMEOUT,
+        connect_timeout=TELEGRAM_TIMEOUT,
+        pool_timeout=TELEGRAM_TIMEOUT,
+    )
+
+
+class TelegramAPI:
+    """
+    Flood-controlled access to the Bot API, shared by every module.
+
+    Each call waits for a global token bucket (~30 requests/s) and, for
+    messages, a per-chat bucket (~1/s per chat). At most `max_in_flight`
+    requests run at once. RetryAfter pauses the global bucket for the time
+    Telegram asks and retries the call up to `max_retries` times.
+    """
+
+    def __init__(self, global_rate: float = TELEGRAM_GLOBAL_RATE, per_chat_rate: float = TELEGRAM_PER_CHAT_RATE,
+                 max_in_flight: int = TELEGRAM_MAX_IN_FLIGHT, max_retries: int = TELEGRAM_MAX_RETRIES):
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_limiter = KeyedRateLimiter(per_chat_rate, capacity=1)
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self.max_retries = max_retries
+        self.retries = 0
+        self.bot = None
+
+    def attach(self, bot) -> None:
+        """Use this bot (and its HTTP connection pool) for every call."""
+        self.bot = bot
+
+    async def call(self, make_request, chat_id=None, method="call"):
+        """
+        Await make_request() under the rate limits. make_request must build a
+        fresh coroutine on each call so it can be retried. `method` labels
+        the call's metrics.
+        """
+        with TELEGRAM_CALL_DURATION.time(method):
+            try:
+                return await self._call(make_request, chat_id, method)
+            except Exception as e:
+                TELEGRAM_CALL_ERRORS.inc(method, type(e).__name__)
+                raise
+
+    async def _call(self, make_request, chat_id, method):
+        attempt = 0
+        while True:
+            if chat_id is not None:
+                await self.chat_limiter.acquire(chat_id)
+            await self.global_bucket.acquire()
+            try:
+                async with self._in_flight:
+                    return await make_request()
+            except RetryAfter as e:
+                attempt += 1
+                self.retries += 1
+                TELEGRAM_RETRIES.inc(method)
+                if attempt > self.max_retries:
+                    raise
+                wait = retry_after_seconds(e)
+                logger.warning(f"⏳ Flood control hit, pausing {wait:.0f}s (attempt {attempt})")
+                self.global_bucket.pause(wait)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        return await self.call(lambda: self.bot.send_message(chat_id=chat_id, text=text, **kwargs), chat_id=chat_id,
+                               method="sendMessage")
+
+    async def reply(self, message, text: str, **kwargs):
+        """Reply to an incoming message under the same limits."""
+        return await self.call(lambda: message.reply_text(text, **kwargs), chat_id=message.chat_id,
+                               method="sendMessage")
+
+    async def reply_document(self, message, document: bytes, filename: str, **kwargs):
+        return await self.call(lambda: message.reply_document(document, filename=filename, **kwargs),
+                               chat_id=message.chat_id, method="sendDocument")
+
+    async def edit_message_text(self, query, text: str, **kwargs):
+        """Edit the message a callback query's button belongs to."""
+        return await self.call(lambda: query.edit_message_text(text, **kwargs), chat_id=query.message.chat_id,
+                               method="editMessageText")
+
+    async def answer_callback(self, query, text: str = None):
+        return await self.call(lambda: query.answer(text), method="answerCallbackQuery")
+
+    async def ban_chat_member(self, chat_id: int, user_id: int):
+        return await self.call(lambda: self.bot.ban_chat_member(chat_id=chat_id, user_id=user_id),
+                               method="banChatMember")
+
+    async def unban_chat_member(self, chat_id: int, user_id: int):
+        return await self.call(lambda: self.bot.unban_chat_member(chat_id=chat_id, user_id=user_id),
+                               method="unbanChatMember")
+
+    async def create_chat_invite_link(self, chat_id: int, **kwargs):
+        return await self.call(lambda: self.bot.create_chat_invite_link(chat_id=chat_id, **kwargs),
+                               method="createChatInviteLink")
+
+    async def revoke_chat_invite_link(self, chat_id: int, invite_link: str):
+        return await self.call(lambda: self.bot.revoke_chat_invite_link(chat_id=chat_id, invite_link=invite_link),
+                               method="revokeChatInviteLink")
+
+    async def approve_chat_join_request(self, chat_id: int, user_id: int):
+        return await self.call(lambda: self.bot.approve_chat_join_request(chat_id=chat_id, user_id=user_id),
+                               method="approveChatJoinRequest")
+
+    async def decline_chat_join_request(self, chat_id: int, user_id: int):
+        return await self.call(lambda: self.bot.decline_chat_join_request(chat_id=chat_id, user_id=user_id),
+                               method="declineChatJoinRequest")
+
+    async def kick(self, chat_id: int, user_id: int) -> None:
+        """“Kick” = ban then unban so they can re-join later."""
+        await self.ban_chat_member(chat_id, user_id)
+        await self.unban_chat_member(chat_id, user_id)
+
+
+api = TelegramAPI()
@@ -0,0 +1,172 @@
+# bot/templates.py
+
+from string import Formatter
+
+from config.config import BOT_LOCALE
+
+MARKDOWN_V2 = "MarkdownV2"
+
+# Every character MarkdownV2 reserves, mapped to its backslash-escaped form
+_MARKDOWN_V2_ESCAPES = str.maketrans({char: "\\" + char for char in "_*[]()~`>#+-=|{}.!\\"})
+
+
+def escape_markdown_v2(text) -> str:
+    """Escape all reserved MarkdownV2 characters properly."""
+    if text is None:
+        return ""
+    return str(text).translate(_MARKDOWN_V2_ESCAPES)
+
+
+class Template:
+    """
+    A message body parsed once into literal chunks and named fields.
+
+    Fields use str.format syntax. In MarkdownV2 templates every field is
+    escaped on render unless written as {name:raw}; the literal text must
+    already be valid MarkdownV2.
+    """
+
+    __slots__ = ("name", "parse_mode", "_parts")
+
+    def __init__(self, name: str, source: str, parse_mode: str = None):
+        self.name = name
+        self.parse_mode = parse_mode
+        self._parts = []
+        for literal, field, spec, _ in Formatter().parse(source):
+            if literal:
+                self._parts.append((literal, None, False))
+            if field is not None:
+                self._parts.append((None, field, parse_mode == MARKDOWN_V2 and spec != "raw"))
+
+    def render(self, **fields) -> str:
+        out = []
+        for literal, field, escape in self._parts:
+            if field is None:
+                out.append(literal)
+            elif escape:
+                out.append(escape_markdown_v2(fields[field]))
+            else:
+                out.append(str(fields[field]))
+        return "".join(out)
+
+
+_ADMIN_HELP = (
+    "👮‍♂️ *Admin Commands*\n\n"
+    "/aprobar \\<user\\_id\\> \\[\\.\\.\\.\\] \\- Aprueba pagos y extiende las suscripciones\n"
+    "/denegar \\<user\\_id\\> \\- Rechaza un pago y elimina al usuario\n"
+    "/renovar \\- Notifica a admins que quieres renovar tu suscripción\n"
+    "/tiempoRestante \\- Comprueba días restantes de tu suscripción\n"
+    "/expiring \\<days\\> \\[csv\\] \\- Lista usuarios con suscripciones próximas a vencer\n"
+    "/revocar\\_links \\[user\\_id\\] \\- Revoca links de invitación sin usar\n"
+    "/stats \\[csv\\] \\- Miembros, renovaciones, bajas e ingresos por día\n"
+    "Envía un CSV \\(telegram\\_user\\_id\\[,días\\]\\) para aprobar pagos en lote\n"
+)
+
+# locale -> name -> (parse_mode, source). Missing entries fall back to BOT_LOCALE.
+CATALOG = {
+    "es": {
+        "admin_help": (MARKDOWN_V2, _ADMIN_HELP),
+        "already_registered": (None,
+            "Ya estás registrado en nuestro sistema.\n\n"
+            "Si deseas /renovar tu suscripción o saber cuánto tiempo te queda, "
+            "puedes contactarte con el administrador o enviar el comando /tiempoRestante para verificarlo.\n\n"
+            "¡Gracias por formar parte de nuestro grupo!"),
+        "welcome": (None,
+            "Bienvenido al Bot de 1% aquí podrás /renovar tu suscripción para mantenerte en el grupo. "
+            "También podrás verificar el tiempo que te resta con el comando /tiempoRestante.\n\n"
+            "Si estás aquí es porque ya debes haber realizado el pago para la suscripción y en este momento "
+            "solo debes esperar que un Admin confirme que tu pago ha sido aprobado.\n\n"
+            "Una vez aprobado te enviaré un mensaje por este chat para que te unas al grupo de señales 🚀"),
+        "admin_new_user": (MARKDOWN_V2,
+            "⚠️ *Admin*, tienes una nueva verificación de pago que realizar\\.\n\n"
+            "• *ID:* `{id}`\n"
+            "• *Username:* @{username}\n"
+            "• *Nombre y Apellido:* {first_name} {last_name}\n\n"
+            "El usuario está intentando unirse al grupo\\.\n\n"
+            "Si no tienes un pago de parte de esta persona, contacta o envía el comando "
+            "`/denegar {id}`\n\n"
+            "Para aprobar al usuario y permitirle acceso usa `/aprobar {id}`\n"),
+        "renewal_request": (None,
+            "Estás intentando renovar tu suscripción.\n\n"
+            "Si ya realizaste el pago, por favor espera a que un Admin confirme que tu pago ha sido aprobado.\n\n"
+            "Una vez aprobado te enviaré un mensaje por este chat para que sepas que tu renovación está activa 🚀"),
+        "admin_renewal": (MARKDOWN_V2,
+            "⚠️ *Admin*, tienes una nueva verificación de *renovación* de pago\\.\n\n"
+            "• *ID:* `{id}`\n"
+            "• *Username:* @{username}\n"
+            "• *Nombre y Apellido:* {first_name} {last_name}\n\n"
+            "El usuario está intentando renovar su acceso\\.\n\n"
+            "Si no tienes un pago de parte de esta persona, contacta o envía el comando "
+            "`/denegar {id}`\n\n"
+            "Para aprobar la renovación usa `/aprobar {id}`\n"),
+        "payment_approved": (None,
+            "✅ ¡Tu pago ha sido confirmado! Tienes acceso hasta {paid_until}. \n\n "
+            "Por favor utiliza este link para unirte al grupo: 🔗 {invite_link}"),
+        "payment_renewed": (None, "✅ ¡Tu pago ha sido confirmado! Tu suscripción sigue activa hasta {paid_until}."),
+        "payment_denied": (None, "🚫 Tu pago no fue confirmado. Contacta con un administrador."),
+        "join_declined": (None,
+            "🚫 No encontramos una suscripción activa para tu cuenta.\n\n"
+            "Si ya realizaste el pago, envía /start o /renovar y un administrador lo revisará."),
+        "reminder_today": (MARKDOWN_V2,
+            "⚠️ Hasta el día de hoy llega tu suscripción, de no cancelar, "
+            "serás automáticamente sacado del grupo\\.\n\n"
+            "Para renovar contacta a la persona que te ingresó\\.\n\n"
+            "_Este es un mensaje automático\\._"),
+        "reminder_tomorrow": (MARKDOWN_V2,
+            "🔔 Hola {name}, mañana se vence tu suscripción, recuerda realizar el pago con anticipación\\.\n\n"
+            "Para renovar contacta a la persona que te agregó al grupo o envia /renovar y un administrador "
+            "se contactará contigo lo antes posible\\.\n\n"
+            "_Este es un mensaje automático\\._"),
+        "reminder_expired": (MARKDOWN_V2,
+            "⚠️ Tu suscripción venció el {paid_until}, y no hemos recibido una renovación\\.\n\n"
+            "Por esta razón serás removido del grupo\\.\n\n"
+            "Para volver a ingresar, realiza el pago correspondiente y usa el comando /start o /renovar\\.\n\n"
+            "_Este es un mensaje automático\\._"),
+        "expiring_header": (MARKDOWN_V2,
+            "📅 *Suscripciones por vencer:* {total} usuarios\n"
+            "_Página {page} de {pages}_\n"),
+        "expiring_line": (MARKDOWN_V2, "• @{username} \\| {name} \\| `{paid_until:raw}`"),
+        "stats_header": (MARKDOWN_V2,
+            "📊 *Estadísticas*\n\n"
+            "👥 *Miembros:* {members} \\({active} activos, {expired} vencidos por remover\\)\n"),
+        "stats_period": (MARKDOWN_V2,
+            "*{label}:* {new_members} nuevos, {renewals} renovaciones, {removals} bajas"),
+        "stats_revenue": (MARKDOWN_V2, "   💰 {revenue} {currency}"),
+        "stats_churn": (MARKDOWN_V2, "📉 *Churn 30 días:* {churn}%"),
+    },
+    "en": {
+        "reminder_today": (MARKDOWN_V2,
+            "⚠️ Your subscription ends today\\. Unless you renew, you will be removed from the group "
+            "automatically\\.\n\n"
+            "To renew, contact the person who added you\\.\n\n"
+            "_This is an automated message\\._"),
+        "reminder_tomorrow": (MARKDOWN_V2,
+            "🔔 Hi {name}, your subscription ends tomorrow, remember to pay ahead of time\\.\n\n"
+            "To renew, contact the person who added you to the group or send /renovar and an admin "
+            "will get in touch as soon as possible\\.\n\n"
+            "_This is an automated message\\._"),
+        "reminder_expired": (MARKDOWN_V2,
+            "⚠️ Your subscription ended on {paid_until} and we have not received a renewal\\.\n\n"
+            "For this reason you will be removed from the group\\.\n\n"
+            "To join again, make the payment and use /start or /renovar\\.\n\n"
+            "_This is an automated message\\._"),
+    },
+}
+
+# Compiled once at import, i.e. at startup
+_TEMPLATES = {
+    locale: {name: Template(name, source, parse_mode) for name, (parse_mode, source) in entries.items()}
+    for locale, entries in CATALOG.items()
+}
+
+
+def get(name: str, locale: str = None) -> Template:
+    """The compiled template for `name` in `locale`, falling back to the default locale."""
+    template = _TEMPLATES.get(locale or BOT_LOCALE, {}).get(name)
+    if template is None:
+        template = _TEMPLATES.get(BOT_LOCALE, {}).get(name) or _TEMPLATES["es"][name]
+    return template
+
+
+def render(name: str, /, locale: str = None, **fields) -> str:
+    return get(name, locale).render(**fields)
@@ -1,12 +1,25 @@
+"""
+Channel participant sync. Scheduled inside the bot by cron/jobs.py; run it
+by hand (and log in interactively the first time) from src/ with:
+python -m bot.update_db
+"""
 import os
+import sys
+import json
+import time
 import asyncio
 import datetime
+import hashlib
 import logging
-import sqlite3
 from telethon import TelegramClient
 from telethon.sessions import StringSession
+from telethon.tl import types
 from telethon.tl.types import ChannelParticipant
+from telethon.utils import get_peer_id
 from dotenv import load_dotenv
+from config.config import SYNC_PAGE_SIZE
+from db import repository
+from utils.helpers import format_date
 
 # Load environment variables
 load_dotenv()
@@ -17,26 +30,243 @@ logger = logging.getLogger(__name__)
 
 # API credentials
 
-API_ID = int(os.getenv("API_ID"))
+API_ID = int(os.getenv("API_ID", 0))
 API_HASH = os.getenv("API_HASH")
 CHANNEL_ID = int(os.getenv("CHANNEL_ID", "-1002143862834"))
 SESSION_STRING = os.getenv("SESSION_STRING", "")
 
-# Create Telegram Client
-client = TelegramClient(StringSession(SESSION_STRING or None), API_ID, API_HASH)
+# Telegram keeps the admin log for 48 hours; an older watermark may have missed events
+ADMIN_LOG_WINDOW = 47 * 3600
+MEMBER_LOG_KEY = "member_log_watermark"
 
-async def update_database():
+_client = None
+
+def get_client():
+    """Create the Telethon client on first use, so importing this module needs no credentials."""
+    global _client
+    if _client is None:
+        _client = TelegramClient(StringSession(SESSION_STRING or None), API_ID, API_HASH)
+    return _client
+
+def _join_date(participant):
+    """Extract the date a participant joined the channel, or None."""
+    if hasattr(participant, "participant") and isinstance(participant.participant, ChannelParticipant):
+        if hasattr(participant.participant, "date"):
+            date_value = participant.participant.date
+            if isinstance(date_value, datetime.datetime):
+                return date_value.date()
+            elif isinstance(date_value, int):
+                return datetime.datetime.fromtimestamp(date_value, tz=datetime.timezone.utc).date()
+    return None
+
+def _member_change(event):
+    """
+    (user_id, is_member) for an admin log event that adds or removes a
+    channel member, or None for any other event.
+    """
+    action = event.action
+    if isinstance(action, (types.ChannelAdminLogEventActionParticipantJoin,
+                           types.ChannelAdminLogEventActionParticipantJoinByInvite,
+                           types.ChannelAdminLogEventActionParticipantJoinByRequest)):
+        return event.user_id, True
+    if isinstance(action, types.ChannelAdminLogEventActionParticipantLeave):
+        return event.user_id, False
+    if isinstance(action, types.ChannelAdminLogEventActionParticipantInvite):
+        return action.participant.user_id, True
+    if isinstance(action, types.ChannelAdminLogEventActionParticipantToggleBan):
+        new = action.new_participant
+        if isinstance(new, types.ChannelParticipantLeft):
+            return get_peer_id(new.peer), False
+        if isinstance(new, types.ChannelParticipantBanned) and (new.left or new.banned_rights.view_messages):
+            return get_peer_id(new.peer), False
+    return None
+
+def _sync_row(user, join_date, today, existing):
     """
-    Fetch all users in the channel and calculate how many 30-day periods 
-    have elapsed since join_date. Also compute the next due date by adding 
-    30-day blocks until it's beyond today. Then, optionally, store these 
-    results in the DB or just print them.
+    Compute the users row to write for a member, or None when nothing changes.
+    New members are inserted; existing members are only updated once expired.
     """
+    user_id = user.id
+    username = user.username or "N/A"
+    first_name = user.first_name or ""
+    last_name = user.last_name or ""
+    full_name = f"{first_name} {last_name}".strip() or "N/A"
+
+    if not join_date:
+        logger.warning(f"⚠️ Skipping {full_name} (ID: {user_id}) - No join date available.")
+        return None
+
+    # Calculate how many days since join
+    delta_days = (today - join_date).days
+
+    if delta_days < 0:
+        # Future join date? Probably an error, skip
+        logger.warning(f"❗ {full_name} joined in the future? Skipping.")
+        return None
+
+    # Number of complete 30-day blocks
+    completed_blocks = delta_days // 30
+
+    # Next due date: the first 30-day boundary after 'today'
+    next_due = join_date + datetime.timedelta(days=30 * (completed_blocks + 1))
+
+    logger.debug(
+        f"🔎 USER: {full_name} (@{username}), "
+        f"Joined: {join_date}, Days since: {delta_days}, "
+        f"Blocks: {completed_blocks}, Next due: {next_due}"
+    )
+
+    if user_id in existing:
+        paid_until_day = existing[user_id]
+        if paid_until_day is not None and paid_until_day >= today.toordinal():
+            # Still paid up: leave the record alone
+            return None
+        logger.info(f"🆕 Updated paid_until -> {next_due} for {user_id}")
+
+    return (user_id, username, first_name, last_name, format_date(join_date), format_date(next_due))
+
+def _digest_step(digest, user_id):
+    """Fold one member id into an order-independent digest of the member set."""
+    return digest ^ int.from_bytes(hashlib.blake2b(str(user_id).encode(), digest_size=8).digest(), "big")
+
+async def _latest_log_id(client, channel):
+    """Id of the newest membership event in the admin log (0 if none), or None without admin rights."""
+    try:
+        async for event in client.iter_admin_log(channel, limit=1, join=True, leave=True, invite=True, ban=True):
+            return event.id
+        return 0
+    except Exception as e:
+        logger.warning(f"⚠️ Can't read the admin log ({e}); every sync will walk all participants.")
+        return None
+
+async def _upsert_pages(rows):
+    for start in range(0, len(rows), SYNC_PAGE_SIZE):
+        await repository.upsert_members(rows[start:start + SYNC_PAGE_SIZE])
+
+async def _sync_from_admin_log(client, channel, watermark, existing, snapshot, today):
+    """
+    Apply the join/leave/kick events logged since the watermark to the
+    snapshot, without walking the participant list. Returns the summary, or
+    None when the result doesn't add up to the channel's member count and a
+    full walk is needed.
+    """
+    stored_digest = await repository.get_state("member_digest")
+    if stored_digest is None:
+        return None
+
+    last_id = watermark["id"]
+    changes = {}
+    async for event in client.iter_admin_log(
+        channel, min_id=watermark["id"], join=True, leave=True, invite=True, ban=True
+    ):
+        last_id = max(last_id, event.id)
+        change = _member_change(event)
+        # Newest first: the first event seen for a user is where they stand now
+        if change is not None and change[0] not in changes:
+            changes[change[0]] = (change[1], event)
+
+    joined_events = {uid: event for uid, (is_member, event) in changes.items() if is_member and uid not in snapshot}
+    left = [uid for uid, (is_member, _) in changes.items() if not is_member and uid in snapshot]
+    members = len(snapshot) + len(joined_events) - len(left)
+    total = (await client.get_participants(channel, limit=0)).total
+    if total != members:
+        logger.warning(f"⚠️ Admin log gives {members} members but the channel has {total}; walking participants.")
+        return None
+
+    digest = int(stored_digest, 16)
+    rows = []
+    joined = []
+    for uid, event in joined_events.items():
+        digest = _digest_step(digest, uid)
+        join_date = event.date.date()
+        joined.append((uid, format_date(join_date)))
+        user = event.entities.get(uid)
+        row = _sync_row(user, join_date, today, existing) if user is not None else None
+        if row is not None:
+            rows.append(row)
+    for uid in left:
+        digest = _digest_step(digest, uid)
+    await _upsert_pages(rows)
+
+    watermark = json.dumps({"id": last_id, "at": time.time()})
+    await repository.save_member_snapshot(joined, left, f"{digest:016x}", watermark)
+    ghosts = existing.keys() - ((snapshot - set(left)) | joined_events.keys())
+    return dict(total=total, joined=len(joined), left=len(left), ghosts=len(ghosts), written=len(rows))
+
+async def _sync_all(client, channel, full, existing, snapshot, today):
+    """Walk every participant and reconcile the whole member set. Returns the summary, empty if nobody was found."""
+    # Taken before the walk, so events during it are replayed by the next incremental run
+    log_id = await _latest_log_id(client, channel)
+
+    logger.info("🔍 Fetching participants...")
+    current = set()
+    joined = []
+    digest = 0
+    written = 0
+    page = []
+
+    async for participant in client.iter_participants(channel):
+        current.add(participant.id)
+        digest = _digest_step(digest, participant.id)
+        is_new = participant.id not in snapshot
+        join_date = _join_date(participant)
+        if is_new:
+            joined.append((participant.id, format_date(join_date) if join_date else None))
+        if not (is_new or full):
+            continue
+        row = _sync_row(participant, join_date, today, existing)
+        if row is not None:
+            page.append(row)
+        if len(page) >= SYNC_PAGE_SIZE:
+            await repository.upsert_members(page)
+            written += len(page)
+            page = []
+
+    if page:
+        await repository.upsert_members(page)
+        written += len(page)
+
+    if not current:
+        logger.warning("❌ No participants found.")
+        return {}
+
+    digest = f"{digest:016x}"
+    left = snapshot - current
+    ghosts = existing.keys() - current
+    if digest == await repository.get_state("member_digest") and not joined and not left:
+        logger.info("✅ Member set unchanged since last sync.")
+    watermark = json.dumps({"id": log_id, "at": time.time()}) if log_id is not None else ""
+    await repository.save_member_snapshot(joined, left, digest, watermark)
+    return dict(total=len(current), joined=len(joined), left=len(left), ghosts=len(ghosts), written=written)
+
+async def update_database(full=False, interactive=True):
+    """
+    Reconcile the channel's members with the member snapshot kept from the
+    last sync:
+      - joined: in the channel but not in the snapshot -> inserted, or given the
+        next due date if their subscription had expired.
+      - left: in the snapshot but no longer in the channel.
+      - ghosts: in users but not in the channel.
+    Routine runs only read the channel's admin log from the watermark the
+    last sync left. Every participant is streamed page by page instead when
+    full=True (which also re-checks members already in the snapshot), when
+    the watermark is missing or older than the admin log keeps, or when the
+    logged changes don't match the channel's member count.
+    Writes are batched UPSERTs, one per page.
+    With interactive=False (scheduled runs) a missing session is an error
+    instead of a phone-number prompt.
+    Returns a summary dict with the counts.
+    """
+    summary = {}
+    client = get_client()
     try:
         logger.info("🔄 Connecting to Telegram...")
         await client.connect()
 
         if not SESSION_STRING:
+            if not interactive:
+                logger.error("❌ SESSION_STRING is not set; run python -m bot.update_db once to log in.")
+                return summary
             logger.info("🔑 Logging in. Enter your phone number when prompted.")
             await client.start()
             new_session_string = client.session.save()
@@ -51,96 +281,37 @@ async def update_database():
         # Get channel entity
         channel = await client.get_entity(CHANNEL_ID)
 
-        # Fetch participants
-        logger.info("🔍 Fetching participants...")
-        participants = await client.get_participants(channel, limit=300)
-        if not participants:
-            logger.warning("❌ No participants found.")
-            return
-
-        logger.info(f"👥 Total participants: {len(participants)}")
-
-        # Connect to the database
-        conn = sqlite3.connect("db/database.db")
-        cursor = conn.cursor()
-
-        for participant in participants:
-            user_id = participant.id
-            username = participant.username or "N/A"
-            first_name = participant.first_name or ""
-            last_name = participant.last_name or ""
-            full_name = f"{first_name} {last_name}".strip() or "N/A"
-
-            # Extract join date
-            join_date = None
-            if hasattr(participant, "participant") and isinstance(participant.participant, ChannelParticipant):
-                if hasattr(participant.participant, "date"):
-                    date_value = participant.participant.date
-                    if isinstance(date_value, datetime.datetime):
-                        join_date = date_value.date()
-                    elif isinstance(date_value, int):
-                        join_date = datetime.datetime.fromtimestamp(date_value, tz=datetime.timezone.utc).date()
-
-            if not join_date:
-                logger.warning(f"⚠️ Skipping {full_name} (ID: {user_id}) - No join date available.")
-                continue
-
-            # Calculate how many days since join
-            today = datetime.date.today()
-            delta_days = (today - join_date).days
-
-            if delta_days < 0:
-                # Future join date? Probably an error, skip
-                logger.warning(f"❗ {full_name} joined in the future? Skipping.")
-                continue
-
-            # Number of complete 30-day blocks
-            completed_blocks = delta_days // 30
-
-            # Next due date: keep adding 30-day blocks to join_date until it's after 'today'
-            next_due = join_date
-            while next_due <= today:
-                next_due += datetime.timedelta(days=30)
-
-            # Check what's in the DB (optional)
-            cursor.execute("SELECT paid_until FROM users WHERE telegram_user_id = ?", (user_id,))
-            existing_record = cursor.fetchone()
-
-            # Just print results (adjust as needed)
-            logger.info(
-                f"🔎 USER: {full_name} (@{username}), "
-                f"Joined: {join_date}, Days since: {delta_days}, "
-                f"Blocks: {completed_blocks}, Next due: {next_due}"
-            )
-
-            # Optional: store next_due in the DB
-            if existing_record:
-                current_paid_until = datetime.datetime.strptime(existing_record[0], '%Y-%m-%d').date()
-                if current_paid_until < today:
-                    # Update with next_due
-                    cursor.execute(
-                        "UPDATE users SET paid_until = ? WHERE telegram_user_id = ?",
-                        (next_due, user_id)
-                    )
-                    logger.info(f"🆕 Updated paid_until -> {next_due}")
-                pass
-            else:
-                # Insert if doesn't exist
-                cursor.execute(
-                    "INSERT INTO users (telegram_user_id, username, first_name, last_name, join_date, paid_until) VALUES (?,?,?,?,?,?)",
-                    (user_id, username, first_name, last_name, join_date, next_due)
-                )
-                pass
-
-        conn.commit()
-        conn.close()
+        # One query each for the current users and the last sync's member set
+        existing = await repository.get_paid_until_days()
+        snapshot = await repository.get_member_snapshot()
+        today = datetime.date.today()
+
+        watermark = json.loads(await repository.get_state(MEMBER_LOG_KEY) or "null")
+        if not full and watermark and time.time() - watermark["at"] < ADMIN_LOG_WINDOW:
+            summary = await _sync_from_admin_log(client, channel, watermark, existing, snapshot, today)
+        if not summary:
+            summary = await _sync_all(client, channel, full, existing, snapshot, today)
+        if not summary:
+            return {}
+
+        logger.info(
+            f"👥 Total participants: {summary['total']}, joined: {summary['joined']}, left: {summary['left']}, "
+            f"ghosts (in DB, not in channel): {summary['ghosts']}, rows written: {summary['written']}"
+        )
 
     except Exception as e:
         logger.error(f"❌ Error: {e}")
     finally:
         await client.disconnect()
         logger.info("🔌 Disconnected from Telegram.")
+    return summary
 
+async def main():
+    # --full re-checks every member instead of only the ones that joined since the last sync
+    try:
+        await update_database(full="--full" in sys.argv[1:])
+    finally:
+        await repository.close_repository()
 
 if __name__ == "__main__":
-    asyncio.run(update_database())
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,109 @@
+# bot/webhook.py
+
+import asyncio
+import hmac
+import json
+import logging
+import signal
+
+from telegram import Update
+
+from config.config import (
+    HTTP_READ_TIMEOUT,
+    WEBHOOK_LISTEN,
+    WEBHOOK_MAX_CONNECTIONS,
+    WEBHOOK_PATH,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_URL,
+)
+from utils.http import start_http_server
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+
+def make_update_handler(app):
+    """
+    HTTP handler that validates the secret token and queues the update for
+    the Application, exactly as if it had come from polling.
+    """
+    path = "/" + WEBHOOK_PATH.strip("/")
+
+    async def handle(request):
+        if request.path != path:
+            return 404, b""
+        if request.method != "POST":
+            return 405, b""
+        # run_webhook() only allows an empty secret in local mode (no WEBHOOK_URL)
+        if WEBHOOK_SECRET and not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, ""), WEBHOOK_SECRET
+        ):
+            logger.warning("🚫 Webhook request with an invalid secret token")
+            return 403, b""
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return 400, b""
+        await app.update_queue.put(Update.de_json(data, app.bot))
+        return 200, b""
+
+    return handle
+
+
+async def _serve(app, allowed_updates):
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+
+    server = await start_http_server(
+        WEBHOOK_LISTEN, WEBHOOK_PORT, make_update_handler(app),
+        max_connections=WEBHOOK_MAX_CONNECTIONS, read_timeout=HTTP_READ_TIMEOUT,
+    )
+    await app.start()
+
+    if WEBHOOK_URL:
+        await app.bot.set_webhook(
+            url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=allowed_updates,
+        )
+        logger.info(f"✅ Webhook registered at {WEBHOOK_URL}")
+    else:
+        logger.info("ℹ️ WEBHOOK_URL not set: serving locally without registering the webhook")
+
+    try:
+        await stop.wait()
+    finally:
+        server.close()
+        await server.wait_closed()
+        await app.stop()
+        if app.post_stop:
+            await app.post_stop(app)
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+
+
+def run_webhook(app, allowed_updates=None):
+    """
+    Serve updates over a webhook instead of long polling.
+    With WEBHOOK_URL empty the server runs without calling setWebhook, so it
+    can be tested locally by POSTing recorded update JSON, for example:
+
+        python -m bot.replay_update recorded_update.json
+
+    A public webhook (WEBHOOK_URL set) requires WEBHOOK_SECRET: without it
+    anyone who finds the URL could post forged updates, e.g. an /aprobar
+    "from" an admin.
+    """
+    if WEBHOOK_URL and not WEBHOOK_SECRET:
+        raise RuntimeError("WEBHOOK_SECRET must be set when WEBHOOK_URL is set")
+    asyncio.run(_serve(app, allowed_updates))
@@ -19,4 +19,109 @@ ADMIN_IDS = set(map(int, ADMIN_IDS.split(','))) if ADMIN_IDS else set()
 
 # Path to SQLite database
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATABASE_PATH = os.path.join(BASE_DIR, "../db/database.db")
\ No newline at end of file
+DATABASE_PATH = os.path.join(BASE_DIR, "../db/database.db")
+
+# Number of pooled SQLite connections (and executor threads) used by db/repository.py
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 4))
+
+# Reminder dispatch concurrency (cron/dispatch.py)
+NOTIFY_CONCURRENCY = int(os.getenv("NOTIFY_CONCURRENCY", 20))
+
+# Bot API flood control and HTTP pool (bot/telegram_api.py).
+# Telegram allows ~30 messages/s per bot and ~1/s per chat.
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))
+TELEGRAM_PER_CHAT_RATE = float(os.getenv("TELEGRAM_PER_CHAT_RATE", 1))
+TELEGRAM_MAX_IN_FLIGHT = int(os.getenv("TELEGRAM_MAX_IN_FLIGHT", 32))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", 3))
+TELEGRAM_CONNECTION_POOL_SIZE = int(os.getenv("TELEGRAM_CONNECTION_POOL_SIZE", 32))
+TELEGRAM_TIMEOUT = float(os.getenv("TELEGRAM_TIMEOUT", 10))
+
+# Pending writes collected by db/batch.WriteBatcher before a flush
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", 500))
+
+# Participants written per batched UPSERT by bot/update_db.py
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", 200))
+
+# In-process cache of user subscription state (db/cache.py)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 300))
+
+# Seconds to coalesce pending admin notifications into one digest message (0 = send each one)
+ADMIN_DIGEST_WINDOW = float(os.getenv("ADMIN_DIGEST_WINDOW", 0))
+
+# Update delivery: "polling" (default) or "webhook" (bot/webhook.py)
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # Public HTTPS URL; empty = don't call setWebhook (local testing)
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8443))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # Required with WEBHOOK_URL; 1-256 chars of A-Z, a-z, 0-9, _ and -
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))
+# Seconds a client of the webhook or metrics server gets to send its request
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 10))
+
+# In-process job schedules (cron/jobs.py). NOTIFY_TIME is local time HH:MM; 0 minutes disables the sync.
+NOTIFY_TIME = os.getenv("NOTIFY_TIME", "09:00")
+SYNC_INTERVAL_MINUTES = int(os.getenv("SYNC_INTERVAL_MINUTES", 15))
+
+# Outbox delivery workers (bot/outbox.py)
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", 8))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 5))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 6))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", 5))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", 3600))
+
+# Prometheus scrape endpoint (GET /metrics); 0 disables it
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+
+# Users per page of the /expiring report
+EXPIRING_PAGE_SIZE = int(os.getenv("EXPIRING_PAGE_SIZE", 20))
+
+# Locale for bot/templates.py messages; templates missing in it fall back to Spanish
+BOT_LOCALE = os.getenv("BOT_LOCALE", "es")
+
+# Group invite link sent with payment confirmations
+INVITE_LINK = os.getenv("INVITE_LINK", "https://t.me/+Qei0MTdpyggzYTNh")
+
+# Updates handled at once; updates for the same user still run in order (bot/processor.py)
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", 64))
+
+# SQLite connection settings (db/database.py); every process opens the database in WAL mode
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 16384))
+SQLITE_BUSY_RETRIES = int(os.getenv("SQLITE_BUSY_RETRIES", 5))
+
+# Database maintenance job: WAL checkpoint every few minutes, ANALYZE/VACUUM daily
+WAL_CHECKPOINT_MINUTES = int(os.getenv("WAL_CHECKPOINT_MINUTES", 10))
+MAINTENANCE_TIME = os.getenv("MAINTENANCE_TIME", "04:30")
+VACUUM_FREE_RATIO = float(os.getenv("VACUUM_FREE_RATIO", 0.2))
+
+# Single-use invite links kept ready for approvals (bot/invites.py); 0 = always send INVITE_LINK
+INVITE_POOL_SIZE = int(os.getenv("INVITE_POOL_SIZE", 20))
+INVITE_LINK_TTL_HOURS = float(os.getenv("INVITE_LINK_TTL_HOURS", 72))
+INVITE_REFILL_INTERVAL = float(os.getenv("INVITE_REFILL_INTERVAL", 300))
+
+# Full reload of the in-memory subscriber index used for join requests (bot/subscribers.py); 0 = never
+SUBSCRIBER_RELOAD_MINUTES = int(os.getenv("SUBSCRIBER_RELOAD_MINUTES", 60))
+
+# Reminder runs (cron/tasks.py): users per checkpointed chunk, and how often the run repeats after
+# NOTIFY_TIME (0 = once a day). Reruns only send reminders missing from the notifications log.
+NOTIFY_CHUNK_SIZE = int(os.getenv("NOTIFY_CHUNK_SIZE", 500))
+NOTIFY_INTERVAL_MINUTES = int(os.getenv("NOTIFY_INTERVAL_MINUTES", 60))
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", 90))
+
+# In-process expiry scheduler (bot/expiry.py): deadlines within this many days are kept in memory
+# and fired on time; expired users are removed at EXPIRY_KICK_TIME the day after paid_until. 0 disables it.
+EXPIRY_HORIZON_DAYS = int(os.getenv("EXPIRY_HORIZON_DAYS", 7))
+EXPIRY_KICK_TIME = os.getenv("EXPIRY_KICK_TIME", "00:00")
+
+# Removed users are moved to users_archive by a background job (cron/jobs.py); 0 minutes disables it
+ARCHIVE_INTERVAL_MINUTES = int(os.getenv("ARCHIVE_INTERVAL_MINUTES", 30))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 500))
+
+# Price of a SUBSCRIPTION_DAYS approval, used for the revenue figures of /stats; 0 hides them
+PAYMENT_AMOUNT = float(os.getenv("PAYMENT_AMOUNT", 0))
+PAYMENT_CURRENCY = os.getenv("PAYMENT_CURRENCY", "USD")
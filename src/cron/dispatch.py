@@ -0,0 +1,89 @@
+# cron/dispatch.py
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+
+from bot.telegram_api import api
+from config.config import NOTIFY_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RunSummary:
+    items: int = 0
+    calls: int = 0
+    failed_items: int = 0
+    retries: int = 0
+    counts: dict = field(default_factory=dict)
+    started_at: float = field(default_factory=time.monotonic)
+    duration: float = 0.0
+    call_time: float = 0.0
+    max_call_time: float = 0.0
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def describe(self) -> str:
+        avg_call = self.call_time / self.calls if self.calls else 0.0
+        counts = ", ".join(f"{name}={value}" for name, value in sorted(self.counts.items())) or "-"
+        return (
+            f"{self.items} users in {self.duration:.1f}s "
+            f"({self.items / self.duration if self.duration else 0:.1f}/s), "
+            f"{self.calls} API calls (avg {avg_call * 1000:.0f}ms, max {self.max_call_time * 1000:.0f}ms), "
+            f"{self.retries} retries, {self.failed_items} failed, {counts}"
+        )
+
+
+class Dispatcher:
+    """
+    Runs a per-item coroutine over many items with bounded concurrency.
+    Telegram calls made through call() are timed for the run summary; they
+    should use the shared rate-limited api wrapper (bot/telegram_api.py).
+    """
+
+    def __init__(self, concurrency: int = NOTIFY_CONCURRENCY):
+        self.concurrency = concurrency
+        self.summary = RunSummary()
+        self._retries_at_start = api.retries
+
+    async def call(self, make_request):
+        """Await make_request(), recording its latency."""
+        started = time.monotonic()
+        try:
+            return await make_request()
+        finally:
+            elapsed = time.monotonic() - started
+            self.summary.calls += 1
+            self.summary.call_time += elapsed
+            self.summary.max_call_time = max(self.summary.max_call_time, elapsed)
+
+    async def run(self, items, handle, label=str) -> RunSummary:
+        """
+        Run `await handle(item)` for every item with at most `concurrency` in flight.
+        label(item) names the item in error logs. Repeated runs add to the same summary.
+        """
+        queue = asyncio.Queue()
+        for item in items:
+            queue.put_nowait(item)
+        self.summary.items += queue.qsize()
+
+        async def worker():
+            while True:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    await handle(item)
+                except Exception as e:
+                    self.summary.failed_items += 1
+                    logger.error(f"❌ Failed to handle {label(item)}: {e}")
+
+        workers = min(self.concurrency, queue.qsize())
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        self.summary.retries = api.retries - self._retries_at_start
+        self.summary.duration = time.monotonic() - self.summary.started_at
+        return self.summary
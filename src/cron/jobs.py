@@ -0,0 +1,160 @@
+# cron/jobs.py
+
+import datetime
+import logging
+
+from telegram.ext import Application, ContextTypes
+
+from bot import update_db
+from bot.subscribers import subscribers
+from config.config import (
+    ARCHIVE_BATCH_SIZE,
+    ARCHIVE_INTERVAL_MINUTES,
+    MAINTENANCE_TIME,
+    NOTIFICATION_RETENTION_DAYS,
+    NOTIFY_INTERVAL_MINUTES,
+    NOTIFY_TIME,
+    SUBSCRIBER_RELOAD_MINUTES,
+    SYNC_INTERVAL_MINUTES,
+    VACUUM_FREE_RATIO,
+    WAL_CHECKPOINT_MINUTES,
+)
+from cron.tasks import notify_users
+from db import repository
+
+logger = logging.getLogger(__name__)
+
+
+def _state_key(name: str) -> str:
+    return f"job:{name}:last_run"
+
+
+async def get_last_run(name: str):
+    value = await repository.get_state(_state_key(name))
+    return datetime.datetime.fromisoformat(value) if value else None
+
+
+async def set_last_run(name: str, when: datetime.datetime) -> None:
+    await repository.set_state(_state_key(name), when.isoformat())
+
+
+def _local_now() -> datetime.datetime:
+    return datetime.datetime.now().astimezone()
+
+
+def _local_time(value: str) -> datetime.time:
+    hour, minute = map(int, value.split(":"))
+    return datetime.time(hour, minute, tzinfo=_local_now().tzinfo)
+
+
+async def notify_users_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Reminders, from NOTIFY_TIME on. Safe to repeat: reminders already in the
+    notifications log are skipped and an interrupted run resumes.
+    """
+    now = _local_now()
+    if now.timetz() < _local_time(NOTIFY_TIME):
+        return
+    if await notify_users():
+        await set_last_run("notify_users", now)
+
+
+async def sync_members_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Incremental participant sync (bot/update_db.py)."""
+    now = _local_now()
+    await update_db.update_database(interactive=False)
+    await set_last_run("sync_members", now)
+
+
+async def reload_subscribers_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Pick up subscription changes written by other processes (cron/tasks.py, bot/update_db.py run by hand)."""
+    await subscribers.reload()
+
+
+async def checkpoint_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Keep the WAL file small between the daily maintenance runs."""
+    busy, wal_pages, checkpointed = await repository.checkpoint_wal()
+    if busy:
+        logger.info(f"🗄️ WAL checkpoint incomplete ({checkpointed}/{wal_pages} pages), readers active")
+
+
+async def maintenance_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """ANALYZE, VACUUM when enough pages are free, and a WAL checkpoint."""
+    result = await repository.run_maintenance(VACUUM_FREE_RATIO)
+    logger.info(
+        f"🧹 Database maintenance: {result['page_count']} pages, {result['free_pages']} free, "
+        f"vacuumed={result['vacuumed']}"
+    )
+    if NOTIFICATION_RETENTION_DAYS > 0:
+        before = datetime.date.today() - datetime.timedelta(days=NOTIFICATION_RETENTION_DAYS)
+        purged = await repository.purge_notifications(before)
+        if purged:
+            logger.info(f"🧹 Purged {purged} old entries from the notifications log")
+    await set_last_run("maintenance", _local_now())
+
+
+async def archive_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Move removed users and their payments out of the live tables."""
+    archived = await repository.archive_removed_users(ARCHIVE_BATCH_SIZE)
+    if archived:
+        logger.info(f"📦 Archived {archived} removed users")
+
+
+async def register_jobs(app: Application) -> None:
+    """
+    Schedule the reminder and sync jobs on the application's job queue, so
+    they share its bot (HTTP connection pool) and database layer.
+    Runs from post_init; last-run state in app_state decides whether a missed
+    daily run must be caught up right away.
+    """
+    job_queue = app.job_queue
+    now = _local_now()
+
+    notify_at = _local_time(NOTIFY_TIME)
+    if NOTIFY_INTERVAL_MINUTES > 0:
+        # The first run doubles as the catch-up after a restart
+        job_queue.run_repeating(
+            notify_users_job,
+            interval=datetime.timedelta(minutes=NOTIFY_INTERVAL_MINUTES),
+            first=datetime.timedelta(seconds=5),
+            name="notify_users",
+        )
+    else:
+        job_queue.run_daily(notify_users_job, time=notify_at, name="notify_users")
+        last_notify = await get_last_run("notify_users")
+        due_today = now.timetz() >= notify_at
+        if due_today and (last_notify is None or last_notify.date() < now.date()):
+            logger.info("⏰ notify_users missed today's run, running it now.")
+            job_queue.run_once(notify_users_job, when=5, name="notify_users_catch_up")
+
+    if SYNC_INTERVAL_MINUTES > 0 and update_db.SESSION_STRING:
+        interval = datetime.timedelta(minutes=SYNC_INTERVAL_MINUTES)
+        last_sync = await get_last_run("sync_members")
+        first = interval - (now - last_sync) if last_sync else datetime.timedelta(seconds=30)
+        job_queue.run_repeating(
+            sync_members_job,
+            interval=interval,
+            first=max(first, datetime.timedelta(seconds=30)),
+            name="sync_members",
+        )
+    else:
+        logger.info("ℹ️ Participant sync job disabled (needs SYNC_INTERVAL_MINUTES > 0 and SESSION_STRING).")
+
+    if SUBSCRIBER_RELOAD_MINUTES > 0:
+        interval = datetime.timedelta(minutes=SUBSCRIBER_RELOAD_MINUTES)
+        job_queue.run_repeating(reload_subscribers_job, interval=interval, first=interval, name="reload_subscribers")
+
+    if ARCHIVE_INTERVAL_MINUTES > 0:
+        job_queue.run_repeating(
+            archive_job, interval=datetime.timedelta(minutes=ARCHIVE_INTERVAL_MINUTES), first=60, name="archive"
+        )
+
+    job_queue.run_daily(maintenance_job, time=_local_time(MAINTENANCE_TIME), name="maintenance")
+    if WAL_CHECKPOINT_MINUTES > 0:
+        job_queue.run_repeating(
+            checkpoint_job, interval=datetime.timedelta(minutes=WAL_CHECKPOINT_MINUTES), name="wal_checkpoint"
+        )
+
+    notify_schedule = f"every {NOTIFY_INTERVAL_MINUTES} min from" if NOTIFY_INTERVAL_MINUTES > 0 else "daily at"
+    logger.info(f"🗓️ Jobs scheduled: notify_users {notify_schedule} {NOTIFY_TIME}, sync every {SYNC_INTERVAL_MINUTES} "
+                f"min, maintenance daily at {MAINTENANCE_TIME}")
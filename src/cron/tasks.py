@@ -1,110 +1,181 @@
-import os
+"""
+Reminder job. Scheduled inside the bot by cron/jobs.py; it can still be
+run by hand from src/ with: python -m cron.tasks
+Reminders are written to the outbox and delivered by the running bot.
+
+Runs are idempotent: every queued reminder is logged in the notifications
+table in the same transaction, and reruns skip what is logged. Work is done
+in chunks and the position after each chunk is saved, so a run that dies
+halfway resumes where it stopped.
+"""
 import asyncio
 import datetime
+import json
 import logging
-import sqlite3
-import re
 from telegram import Bot
-from dotenv import load_dotenv
-
-
-
-# Load environment variables
-load_dotenv()
-
-CHANNEL_ID = int(os.getenv("CHANNEL_ID"))
-BOT_TOKEN = os.getenv("BOT_TOKEN")
+from config.config import BOT_TOKEN, CHANNEL_ID, NOTIFY_CHUNK_SIZE
+from bot import outbox, templates
+from bot.telegram_api import api, build_request
+from cron.dispatch import Dispatcher
+from db import repository
+from db.batch import WriteBatcher
+from utils.helpers import from_day
+from utils.metrics import NOTIFY_RUN_DURATION, NOTIFY_USERS_PROCESSED
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Telegram Bot
-bot = Bot(token=BOT_TOKEN)
+# app_state key holding {"day", "after", "done"} for the latest run
+CHECKPOINT_KEY = "notify_users:checkpoint"
+
+
+async def load_checkpoint(today: datetime.date):
+    """The (paid_until_day, telegram_user_id) key an unfinished run of today stopped after, if any."""
+    value = await repository.get_state(CHECKPOINT_KEY)
+    if not value:
+        return None
+    checkpoint = json.loads(value)
+    if checkpoint["day"] != today.isoformat() or checkpoint["done"] or not checkpoint["after"]:
+        return None
+    return tuple(checkpoint["after"])
+
+
+async def save_checkpoint(today: datetime.date, after, done: bool = False) -> None:
+    await repository.set_state(CHECKPOINT_KEY, json.dumps({"day": today.isoformat(), "after": after, "done": done}))
+
+
+# One reminder batch at a time per process, so the scheduled run and the
+# expiry scheduler (bot/expiry.py) never queue the same reminder twice
+_reminder_lock = asyncio.Lock()
+
+
+async def process_reminders(due, dispatcher: Dispatcher, batcher: WriteBatcher) -> None:
+    """
+    Handle DueReminders from repository.due_reminders(): queue each reminder
+    with its notifications log row, kick expired users and remove them.
+    Reminders and removals are written even if some users fail.
+    """
+    # Reminders go through the outbox, logged with it; only the kicks are direct API calls
+    notifications = []
+
+    # Compiled once; a run renders thousands of these
+    reminder_today = templates.get("reminder_today")
+    reminder_tomorrow = templates.get("reminder_tomorrow")
+    reminder_expired = templates.get("reminder_expired")
+
+    async def handle(reminder):
+        user = reminder.user
+        user_id = user.telegram_user_id
+        paid_until = from_day(user.paid_until_day)
+
+        if reminder.kind == "today":
+            notifications.append(
+                (user_id, reminder_today.render(), reminder_today.parse_mode, "today", user.paid_until_day)
+            )
+            dispatcher.summary.count("today_reminders")
+            logger.info(f"✅ Queued today-expiry reminder for {user_id}")
+
+        elif reminder.kind == "tomorrow":
+            message = reminder_tomorrow.render(name=user.first_name or "Usuario")
+            notifications.append(
+                (user_id, message, reminder_tomorrow.parse_mode, "tomorrow", user.paid_until_day)
+            )
+            dispatcher.summary.count("tomorrow_reminders")
+            logger.info(f"✅ Queued tomorrow reminder for {user_id}")
+
+        else:
+            # Warned by an earlier run whose kick failed: only retry the kick
+            if not reminder.notified:
+                message = reminder_expired.render(paid_until=paid_until)
+                notifications.append(
+                    (user_id, message, reminder_expired.parse_mode, "expired", user.paid_until_day)
+                )
+                dispatcher.summary.count("final_warnings")
+                logger.info(f"✅ Queued final warning for {user_id}")
+
+            await dispatcher.call(lambda: api.kick(CHANNEL_ID, user_id))
+            dispatcher.summary.count("kicks")
+            logger.info(f"🚪 Kicked user {user_id} from the group")
+
+            await batcher.delete_user(user_id)
 
-def escape_markdown_v2(text):
-    if not text:
-        return ""
-    return re.sub(r"([_*\[\]()~`>#+\-=|{}.!\\])", r"\\\1", text)
-
-async def notify_users():
+    try:
+        await dispatcher.run(due, handle, label=lambda reminder: f"user {reminder.user.telegram_user_id}")
+    finally:
+        if notifications:
+            await outbox.enqueue_notifications(notifications)
+        await batcher.flush()
+
+
+def record_run(summary, name: str = "notify_users") -> None:
+    logger.info(f"📊 {name} run: {summary.describe()}")
+    NOTIFY_RUN_DURATION.observe(summary.duration)
+    for outcome, count in summary.counts.items():
+        NOTIFY_USERS_PROCESSED.inc(outcome, amount=count)
+    NOTIFY_USERS_PROCESSED.inc("failed", amount=summary.failed_items)
+
+
+async def notify_users() -> bool:
+    """
+    Queue today/tomorrow reminders and kick expired users through the shared
+    api wrapper. Returns False when the run failed part way.
+    """
     try:
         today = datetime.date.today()
-        tomorrow = today + datetime.timedelta(days=1)
-
-        # Enable safe DATE parsing
-        # Get the project root (assuming tasks.py is in src/cron/)
-        BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        DB_PATH = os.path.join(BASE_DIR, "db", "database.db")
-
-        # Then use DB_PATH to connect:
-        conn = sqlite3.connect(DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES)
-        cursor = conn.cursor()
 
-        cursor.execute("""
-            SELECT telegram_user_id, first_name, username, paid_until FROM users 
-        """)
-
-        expiring_users = cursor.fetchall()
-
-        if not expiring_users:
-            logger.info("✅ No users with expiring subscriptions today or tomorrow.")
-            return
-
-        for user in expiring_users:
-            user_id, first_name, username, paid_until = user
-
-            # if user_id != 7498855771:
-            #     continue
-
-            full_name = escape_markdown_v2(first_name or "Usuario")
-            if isinstance(paid_until, str):
-                paid_until = datetime.datetime.strptime(paid_until, "%Y-%m-%d").date()
-
-            try:
-                if paid_until == today:
-                    message = (
-                        f"⚠️ Hasta el día de hoy llega tu suscripción, de no cancelar, "
-                        f"serás automáticamente sacado del grupo\\.\n\n"
-                        f"Para renovar contacta a la persona que te ingresó\\.\n\n"
-                        f"_Este es un mensaje automático\\._"
-                    )
-                    await bot.send_message(chat_id=user_id, text=message, parse_mode="MarkdownV2")
-                    logger.info(f"✅ Sent today-expiry reminder to {user_id}")
-
-                elif paid_until == tomorrow:
-                    message = (
-                        f"🔔 Hola {full_name}, mañana se vence tu suscripción, recuerda realizar el pago con anticipación\\.\n\n"
-                        "Para renovar contacta a la persona que te agregó al grupo o envia /renovar y un administrador se contactará contigo lo antes posible\\.\n\n"
-                        "_Este es un mensaje automático\\._"
-                    )
-                    await bot.send_message(chat_id=user_id, text=message, parse_mode="MarkdownV2")
-                    logger.info(f"✅ Sent tomorrow reminder to {user_id}")
-
-                elif paid_until < today:
-                    escaped_date = escape_markdown_v2(str(paid_until))  # Escape date with dashes
-                    message = (
-                        f"⚠️ Tu suscripción venció el {escaped_date}, y no hemos recibido una renovación\\.\n\n"
-                        "Por esta razón serás removido del grupo\\.\n\n"
-                        "Para volver a ingresar, realiza el pago correspondiente y usa el comando /start o /renovar\\.\n\n"
-                        "_Este es un mensaje automático\\._"
-                    )
-                    await bot.send_message(chat_id=user_id, text=message, parse_mode="MarkdownV2")
-                    logger.info(f"✅ Sent final warning to {user_id}")
-
-                    await bot.ban_chat_member(chat_id=CHANNEL_ID, user_id=user_id)
-                    await bot.unban_chat_member(chat_id=CHANNEL_ID, user_id=user_id)
-                    logger.info(f"🚪 Kicked user {user_id} from the group")
-
-                    cursor.execute("DELETE FROM users WHERE telegram_user_id = ?", (user_id,))
-                    conn.commit()
-
-            except Exception as e:
-                logger.error(f"❌ Failed to handle user {user_id}: {e}")
-        conn.close()
+        after = await load_checkpoint(today)
+        if after:
+            logger.info(f"⏯️ Resuming today's notify_users run after user {after[1]}")
+
+        dispatcher = Dispatcher()
+        # Each chunk's reminders and removals are written before its checkpoint
+        async with WriteBatcher() as batcher:
+            while True:
+                async with _reminder_lock:
+                    due, more = await repository.due_reminders(today, NOTIFY_CHUNK_SIZE, after)
+                    if not due:
+                        break
+                    await process_reminders(due, dispatcher, batcher)
+                after = (due[-1].user.paid_until_day, due[-1].user.telegram_user_id)
+                await save_checkpoint(today, after)
+                if not more:
+                    break
+        await save_checkpoint(today, None, done=True)
+
+        if not dispatcher.summary.items:
+            logger.info("✅ No reminders pending for subscriptions expiring today or tomorrow.")
+            return True
+        record_run(dispatcher.summary)
+        return True
 
     except Exception as e:
         logger.error(f"❌ Error: {e}")
+        return False
+
+
+async def remind_users(telegram_user_ids) -> None:
+    """
+    Process the reminders and removals due now for just these users; used by
+    the expiry scheduler (bot/expiry.py) as their deadlines pass.
+    """
+    today = datetime.date.today()
+    dispatcher = Dispatcher()
+    async with _reminder_lock:
+        due = await repository.due_reminders_for(today, telegram_user_ids)
+        if not due:
+            return
+        async with WriteBatcher() as batcher:
+            await process_reminders(due, dispatcher, batcher)
+    record_run(dispatcher.summary, "expiry scheduler")
+
+async def main():
+    try:
+        async with Bot(token=BOT_TOKEN, request=build_request()) as bot:
+            api.attach(bot)
+            await notify_users()
+    finally:
+        await repository.close_repository()
 
 if __name__ == "__main__":
-    asyncio.run(notify_users())
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,70 @@
+# db/batch.py
+
+import asyncio
+import logging
+
+from config.config import WRITE_BATCH_SIZE
+from db import repository
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBatcher:
+    """
+    Collects user removals and paid_until updates and applies them with
+    executemany, one transaction per chunk of `chunk_size` writes.
+
+    Use it as an async context manager: pending writes are flushed on exit
+    even when the run fails partway, so completed kicks are never lost.
+    """
+
+    def __init__(self, chunk_size: int = WRITE_BATCH_SIZE):
+        self.chunk_size = chunk_size
+        self._deletes = []
+        self._updates = []
+        self._lock = asyncio.Lock()
+        self.flushed = 0
+
+    def __len__(self):
+        return len(self._deletes) + len(self._updates)
+
+    async def delete_user(self, telegram_user_id: int) -> None:
+        self._deletes.append(telegram_user_id)
+        await self._maybe_flush()
+
+    async def update_paid_until(self, telegram_user_id: int, paid_until: str) -> None:
+        self._updates.append((telegram_user_id, paid_until))
+        await self._maybe_flush()
+
+    async def _maybe_flush(self):
+        if len(self) >= self.chunk_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Apply every pending write in one transaction."""
+        async with self._lock:
+            if not len(self):
+                return
+            deletes, self._deletes = self._deletes, []
+            updates, self._updates = self._updates, []
+            try:
+                await repository.apply_batch(deletes, updates)
+            except Exception:
+                # Keep the writes so a later flush can retry them
+                self._deletes = deletes + self._deletes
+                self._updates = updates + self._updates
+                raise
+            self.flushed += len(deletes) + len(updates)
+            logger.info(f"💾 Flushed {len(deletes)} removals and {len(updates)} updates")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"❌ Failed to flush pending writes: {e}")
+            if exc_type is None:
+                raise
+        return False
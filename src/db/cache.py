@@ -0,0 +1,83 @@
+# db/cache.py
+
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Bounded in-process cache with LRU eviction and a per-entry TTL.
+    Only used from the event loop thread, so it needs no locking.
+
+    A value of None is cached too ("known not to exist"), so repeated lookups
+    of unregistered users are served from memory as well.
+
+    To avoid caching a stale read that raced with a write, readers call
+    begin_read(key) before querying and pass the token to put(); any write or
+    invalidation of the key in between makes that put() a no-op.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._reads = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def begin_read(self, key):
+        token = object()
+        self._reads[key] = token
+        return token
+
+    def put(self, key, value, token=None) -> None:
+        """Store value. With a token from begin_read, skip if the key was written since."""
+        if token is not None:
+            if self._reads.get(key) is not token:
+                return
+            del self._reads[key]
+        else:
+            self._reads.pop(key, None)
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._data)
+
+    def invalidate(self, key) -> None:
+        self._data.pop(key, None)
+        self._reads.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._reads.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,19 +1,74 @@
 # db/database.py
 
+import random
 import sqlite3
 import os
+import time
+from datetime import datetime
 
-def create_connection(db_file="database.db"):
+from config.config import (
+    SQLITE_BUSY_RETRIES,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_SYNCHRONOUS,
+)
+from utils.helpers import SUBSCRIPTION_DAYS
+
+def configure_connection(conn):
+    """
+    Per-connection settings shared by the bot, cron/tasks.py and bot/update_db.py:
+    WAL so readers never wait for the writer, synchronous=NORMAL (durable at
+    checkpoints, safe in WAL mode), a busy timeout instead of failing at once
+    with "database is locked", and a larger page cache.
+    """
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+
+def create_connection(db_file="database.db", check_same_thread=True):
     """
     Create a database connection to the SQLite database specified by db_file.
+    Pass check_same_thread=False for connections shared by a thread pool.
     """
     conn = None
     try:
-        conn = sqlite3.connect(db_file)
+        conn = sqlite3.connect(db_file, check_same_thread=check_same_thread)
+        configure_connection(conn)
     except sqlite3.Error as e:
         print(f"Error connecting to database: {e}")
     return conn
 
+def is_busy(error):
+    """True for the lock errors SQLite raises when another connection holds the write lock."""
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in str(error) or "busy" in str(error))
+
+def run_transaction(conn, fn, *args, attempts=SQLITE_BUSY_RETRIES, mode="IMMEDIATE"):
+    """
+    Run fn(conn, *args) as one transaction and commit it. `conn` must be in
+    autocommit mode (isolation_level=None) so the transaction is opened here:
+    BEGIN IMMEDIATE takes the write lock up front, waiting for it under the
+    busy timeout, so whatever fn reads stays current until its writes commit.
+    Read-only callers pass mode="DEFERRED" for a consistent snapshot without
+    the lock, and mode=None runs fn outside a transaction (VACUUM, checkpoints).
+    On a lock error the whole transaction is rolled back and retried with
+    jittered backoff, up to `attempts` times.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            if mode is not None:
+                conn.execute(f"BEGIN {mode}")
+            result = fn(conn, *args)
+            if conn.in_transaction:
+                conn.execute("COMMIT")
+            return result
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            if not is_busy(e) or attempt == attempts:
+                raise
+            time.sleep(random.uniform(0.5, 1.5) * 0.05 * 2 ** (attempt - 1))
+
 def create_tables(conn):
     """
     Create the users and payments tables.
@@ -51,6 +106,250 @@ def create_tables(conn):
         print("Tables created successfully.")
     except sqlite3.Error as e:
         print(f"Error creating tables: {e}")
+        return
+    migrate(conn)
+
+def _add_paid_until_day(conn):
+    """
+    Store expiry as an indexed integer day ordinal (date.toordinal()) next to
+    the human-readable paid_until, so expiry filters become index range scans.
+    """
+    conn.execute("ALTER TABLE users ADD COLUMN paid_until_day INTEGER")
+    rows = conn.execute("SELECT id, paid_until FROM users WHERE paid_until IS NOT NULL").fetchall()
+    updates = []
+    for user_id, paid_until in rows:
+        try:
+            updates.append((datetime.strptime(paid_until, "%Y-%m-%d").date().toordinal(), user_id))
+        except (TypeError, ValueError):
+            continue  # Leave invalid dates as NULL
+    conn.executemany("UPDATE users SET paid_until_day = ? WHERE id = ?", updates)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_paid_until_day ON users (paid_until_day, telegram_user_id)"
+    )
+
+def _add_member_snapshot(conn):
+    """
+    channel_members keeps the member set seen by the last participant sync so
+    the next one only processes differences. app_state is a small key/value
+    store for watermarks, digests and job bookkeeping.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS channel_members (
+            telegram_user_id INTEGER PRIMARY KEY,
+            join_date TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS app_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+
+def _add_outbox(conn):
+    """
+    Durable queue of outgoing Telegram messages, drained by bot/outbox.py.
+    status: pending -> sending -> (deleted once sent) | dead after too many failures.
+    Times are epoch seconds.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            parse_mode TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            created_at REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)")
+
+def _add_invite_links(conn):
+    """
+    Single-use invite links created ahead of time by bot/invites.py.
+    status: available -> assigned (to telegram_user_id) -> used | revoked.
+    Times are epoch seconds.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS invite_links (
+            invite_link TEXT PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'available',
+            telegram_user_id INTEGER,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL,
+            assigned_at REAL,
+            used_at REAL,
+            used_by INTEGER
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_invite_links_status ON invite_links (status, expires_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_invite_links_user ON invite_links (telegram_user_id)")
+
+def _add_notifications(conn):
+    """
+    Log of reminders already queued, one row per user, kind ('today',
+    'tomorrow', 'expired') and the paid_until_day it was about. Reruns of
+    cron/tasks.py anti-join against it so nobody is reminded twice.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS notifications (
+            telegram_user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            paid_until_day INTEGER NOT NULL,
+            sent_at REAL NOT NULL,
+            PRIMARY KEY (telegram_user_id, kind, paid_until_day)
+        ) WITHOUT ROWID
+    """)
+
+def _add_users_archive(conn):
+    """
+    Removed users are tombstoned in place (removed_at set, paid_until_day
+    cleared) and later moved, with their payments, to users_archive and
+    payments_archive by a batched job, keeping the live tables small.
+    Archived rows keep their ids so a returning user can be moved back.
+    """
+    conn.execute("ALTER TABLE users ADD COLUMN removed_at REAL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_removed ON users (removed_at) WHERE removed_at IS NOT NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_payments_user ON payments (user_id)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users_archive (
+            id INTEGER PRIMARY KEY,
+            telegram_user_id INTEGER UNIQUE NOT NULL,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            join_date TEXT,
+            paid_until TEXT,
+            last_payment_date TEXT,
+            removed_at REAL NOT NULL,
+            archived_at REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS payments_archive (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            payment_date TEXT,
+            paid_until TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_payments_archive_user ON payments_archive (user_id)")
+
+def _add_stats(conn):
+    """
+    Aggregates behind /stats, kept up to date by db/repository.py in the same
+    transaction as the writes they count: stats_daily holds one row of event
+    counts per local day ('YYYY-MM-DD'), stats_counters running totals such
+    as the number of live members. Seeded from the existing rows.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stats_daily (
+            day TEXT PRIMARY KEY,
+            new_members INTEGER NOT NULL DEFAULT 0,
+            approvals INTEGER NOT NULL DEFAULT 0,
+            renewals INTEGER NOT NULL DEFAULT 0,
+            approved_days INTEGER NOT NULL DEFAULT 0,
+            removals INTEGER NOT NULL DEFAULT 0,
+            restored INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    """)
+    seed_stats(conn)
+
+def seed_stats(conn):
+    """
+    Rebuild the stats tables from users, payments and their archives, for
+    rows written without going through db/repository.py. Past payments count
+    as SUBSCRIPTION_DAYS each since their length is not stored.
+    """
+    conn.execute("DELETE FROM stats_daily")
+    conn.execute("""
+        INSERT OR REPLACE INTO stats_counters (name, value)
+        SELECT 'members', COUNT(*) FROM users WHERE removed_at IS NULL
+    """)
+    conn.execute("""
+        INSERT OR REPLACE INTO stats_daily (day, new_members)
+        SELECT join_date, COUNT(*) FROM (
+            SELECT join_date FROM users UNION ALL SELECT join_date FROM users_archive
+        )
+        WHERE join_date LIKE '____-__-__'
+        GROUP BY join_date
+    """)
+    conn.execute("""
+        INSERT INTO stats_daily (day, approvals, renewals, approved_days)
+        SELECT payment_date, COUNT(*), COUNT(*), COUNT(*) * ? FROM (
+            SELECT payment_date FROM payments UNION ALL SELECT payment_date FROM payments_archive
+        )
+        WHERE payment_date LIKE '____-__-__'
+        GROUP BY payment_date
+        ON CONFLICT (day) DO UPDATE SET
+            approvals = excluded.approvals, renewals = excluded.renewals, approved_days = excluded.approved_days
+    """, (SUBSCRIPTION_DAYS,))
+
+# Schema migrations, applied in order. The list index + 1 is stored in PRAGMA user_version.
+MIGRATIONS = [
+    _add_paid_until_day,
+    _add_member_snapshot,
+    _add_outbox,
+    _add_invite_links,
+    _add_notifications,
+    _add_users_archive,
+    _add_stats,
+]
+
+def migrate(conn):
+    """
+    Apply every migration newer than the database's PRAGMA user_version.
+    Each migration runs in its own transaction.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS, start=1):
+        if number <= version:
+            continue
+        try:
+            conn.execute("BEGIN")
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+            print(f"Applied migration {number}: {migration.__name__}")
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"Error applying migration {number}: {e}")
+            raise
+
+def checkpoint(conn):
+    """Copy the WAL back into the database file and truncate it. Returns (busy, wal_pages, checkpointed)."""
+    return conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+
+def maintenance(conn, vacuum_free_ratio=None):
+    """
+    Refresh the query planner statistics, VACUUM when more than
+    vacuum_free_ratio of the pages are free, and checkpoint the WAL.
+    Returns what was done.
+    """
+    conn.execute("ANALYZE")
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    vacuumed = False
+    if vacuum_free_ratio is not None and page_count and free_pages / page_count > vacuum_free_ratio:
+        conn.execute("VACUUM")
+        vacuumed = True
+    busy, wal_pages, _ = checkpoint(conn)
+    return {
+        "page_count": page_count,
+        "free_pages": free_pages,
+        "vacuumed": vacuumed,
+        "checkpoint_busy": bool(busy),
+        "wal_pages": wal_pages,
+    }
 
 def init_db():
     """
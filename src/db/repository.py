@@ -0,0 +1,984 @@
+# db/repository.py
+
+import asyncio
+import logging
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from config.config import DATABASE_PATH, DB_POOL_SIZE, USER_CACHE_SIZE, USER_CACHE_TTL
+from db.cache import MISSING, LRUCache
+from db.database import checkpoint, create_connection, create_tables, maintenance, run_transaction
+from utils.metrics import DB_QUERY_DURATION, DB_QUERY_ERRORS, CallbackCounter, Gauge, registry
+from utils.helpers import compute_new_paid_until, format_date, parse_date, to_day
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class User:
+    id: int
+    telegram_user_id: int
+    username: str
+    first_name: str
+    last_name: str
+    join_date: Optional[str]
+    paid_until: Optional[str]
+    last_payment_date: Optional[str]
+    paid_until_day: Optional[int]
+
+
+USER_COLUMNS = (
+    "id, telegram_user_id, username, first_name, last_name, "
+    "join_date, paid_until, last_payment_date, paid_until_day"
+)
+
+
+def _row_to_user(row) -> Optional[User]:
+    if row is None:
+        return None
+    return User(*row)
+
+
+class ConnectionPool:
+    """
+    A fixed-size pool of long-lived SQLite connections.
+    Connections are only used from the repository executor threads.
+    """
+
+    def __init__(self, db_path: str, size: int):
+        self._connections = queue.Queue()
+        for _ in range(size):
+            conn = create_connection(db_path, check_same_thread=False)
+            if conn is None:
+                raise RuntimeError(f"Cannot open database at {db_path}")
+            # Transactions are opened explicitly by run_transaction()
+            conn.isolation_level = None
+            self._connections.put(conn)
+        self.size = size
+
+    @contextmanager
+    def connection(self):
+        conn = self._connections.get()
+        try:
+            yield conn
+        finally:
+            self._connections.put(conn)
+
+    def close(self):
+        for _ in range(self.size):
+            self._connections.get().close()
+
+
+_pool: Optional[ConnectionPool] = None
+_executor: Optional[ThreadPoolExecutor] = None
+
+# Subscription state by telegram_user_id. Every write below updates it
+# (write-through), so it never serves data older than this process's writes.
+user_cache = LRUCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+# Called with {telegram_user_id: paid_until_day, or None when removed} after
+# each committed write below, so in-memory views can follow along.
+_change_listeners = []
+
+registry.register(CallbackCounter("user_cache_hits_total", "User cache hits.", lambda: user_cache.hits))
+registry.register(CallbackCounter("user_cache_misses_total", "User cache misses.", lambda: user_cache.misses))
+registry.register(Gauge("user_cache_size", "Entries in the user cache.", lambda: len(user_cache)))
+
+
+def init_repository(db_path: str = DATABASE_PATH, pool_size: int = DB_POOL_SIZE) -> None:
+    """Open the connection pool and the executor that runs queries off the event loop."""
+    global _pool, _executor
+    if _pool is not None:
+        return
+    _pool = ConnectionPool(db_path, pool_size)
+    with _pool.connection() as conn:
+        # Standalone scripts (cron, sync) may run before the bot ever started
+        create_tables(conn)
+    _executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="db")
+    logger.info(f"🗄️ Database pool ready ({pool_size} connections)")
+
+
+async def close_repository() -> None:
+    """Shut down the executor and close every pooled connection."""
+    global _pool, _executor
+    if _pool is None:
+        return
+    _executor.shutdown(wait=True)
+    _pool.close()
+    _pool = None
+    _executor = None
+
+
+def _call(fn, args, mode):
+    query = fn.__name__.lstrip("_")
+    with _pool.connection() as conn, DB_QUERY_DURATION.time(query):
+        try:
+            return run_transaction(conn, fn, *args, mode=mode)
+        except Exception:
+            DB_QUERY_ERRORS.inc(query)
+            raise
+
+
+async def _submit(fn, args, mode):
+    if _pool is None:
+        init_repository()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _call, fn, args, mode)
+
+
+async def run(fn, *args):
+    """
+    Run fn(conn, *args) on a pooled connection in the repository executor as
+    one write transaction (BEGIN IMMEDIATE): its reads and writes are atomic,
+    it is committed on success, rolled back on error, and retried when
+    another process holds the write lock.
+    """
+    return await _submit(fn, args, "IMMEDIATE")
+
+
+async def read(fn, *args):
+    """Like run() for read-only fn: one consistent snapshot, without taking the write lock."""
+    return await _submit(fn, args, "DEFERRED")
+
+
+# --- Maintenance -------------------------------------------------------------
+
+def _checkpoint(conn):
+    return checkpoint(conn)
+
+
+async def checkpoint_wal() -> tuple:
+    """Truncate the WAL so it does not grow while readers keep it pinned."""
+    return await _submit(_checkpoint, (), None)
+
+
+def _maintenance(conn, vacuum_free_ratio):
+    return maintenance(conn, vacuum_free_ratio)
+
+
+async def run_maintenance(vacuum_free_ratio: Optional[float] = None) -> dict:
+    return await _submit(_maintenance, (vacuum_free_ratio,), None)
+
+
+# --- Change listeners --------------------------------------------------------
+
+def add_change_listener(listener) -> None:
+    """Register listener(changes) to be told about every subscription change made through this module."""
+    _change_listeners.append(listener)
+
+
+def remove_change_listener(listener) -> None:
+    _change_listeners.remove(listener)
+
+
+def _publish(changes: Dict[int, Optional[int]]) -> None:
+    for listener in _change_listeners:
+        try:
+            listener(changes)
+        except Exception as e:
+            logger.error(f"❌ Change listener {listener!r} failed: {e}")
+
+
+# --- Users -----------------------------------------------------------------
+
+def _get_user(conn, telegram_user_id):
+    cursor = conn.execute(
+        f"SELECT {USER_COLUMNS} FROM users WHERE telegram_user_id = ? AND removed_at IS NULL", (telegram_user_id,)
+    )
+    return _row_to_user(cursor.fetchone())
+
+
+async def get_user(telegram_user_id: int) -> Optional[User]:
+    """Return the user with this Telegram id, or None. Served from user_cache when possible."""
+    user = user_cache.get(telegram_user_id)
+    if user is not MISSING:
+        return user
+    token = user_cache.begin_read(telegram_user_id)
+    user = await read(_get_user, telegram_user_id)
+    user_cache.put(telegram_user_id, user, token)
+    return user
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters of the user cache."""
+    return user_cache.stats()
+
+
+async def user_exists(telegram_user_id: int) -> bool:
+    return await get_user(telegram_user_id) is not None
+
+
+def _restore_users(conn, telegram_user_ids, today):
+    """
+    Bring removed users back as live rows with their original id and
+    payments: tombstones are revived in place, archived users are moved back
+    from users_archive. Each is a primary-key lookup. Returns the restored ids.
+    """
+    restored = []
+    for uid in telegram_user_ids:
+        row = conn.execute(
+            "SELECT paid_until FROM users WHERE telegram_user_id = ? AND removed_at IS NOT NULL", (uid,)
+        ).fetchone()
+        if row is None:
+            row = conn.execute(
+                "SELECT id, paid_until FROM users_archive WHERE telegram_user_id = ?", (uid,)
+            ).fetchone()
+            if row is None:
+                continue
+            row_id, paid_until = row
+            conn.execute("""
+                INSERT INTO users (id, telegram_user_id, username, first_name, last_name, join_date, paid_until,
+                                   last_payment_date)
+                SELECT id, telegram_user_id, username, first_name, last_name, join_date, paid_until,
+                       last_payment_date
+                FROM users_archive WHERE id = ?
+            """, (row_id,))
+            conn.execute("""
+                INSERT INTO payments (id, user_id, payment_date, paid_until)
+                SELECT id, user_id, payment_date, paid_until FROM payments_archive WHERE user_id = ?
+            """, (row_id,))
+            conn.execute("DELETE FROM payments_archive WHERE user_id = ?", (row_id,))
+            conn.execute("DELETE FROM users_archive WHERE id = ?", (row_id,))
+            row = (paid_until,)
+        conn.execute(
+            "UPDATE users SET removed_at = NULL, paid_until_day = ? WHERE telegram_user_id = ?",
+            (to_day(row[0]), uid),
+        )
+        restored.append(uid)
+    _record_stats(conn, today, members=len(restored), restored=len(restored))
+    return restored
+
+
+def _add_user(conn, telegram_user_id, username, first_name, last_name, join_date, paid_until, today):
+    if _restore_users(conn, [telegram_user_id], today):
+        # A returning user: same row and payment history, fresh details
+        conn.execute("""
+            UPDATE users
+            SET username = ?, first_name = ?, last_name = ?, join_date = ?, paid_until = ?, last_payment_date = ?,
+                paid_until_day = ?
+            WHERE telegram_user_id = ?
+        """, (username, first_name, last_name, join_date, paid_until, join_date, to_day(paid_until),
+              telegram_user_id))
+        return _get_user(conn, telegram_user_id)
+    conn.execute("""
+        INSERT INTO users
+            (telegram_user_id, username, first_name, last_name, join_date, paid_until, last_payment_date,
+             paid_until_day)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (telegram_user_id, username, first_name, last_name, join_date, paid_until, join_date,
+          to_day(paid_until)))
+    _record_stats(conn, today, members=1, new_members=1)
+    return _get_user(conn, telegram_user_id)
+
+
+async def add_user(telegram_user_id: int, username: str, first_name: str, last_name: str,
+                   join_date: str, paid_until: str) -> User:
+    """Insert a new user and return it."""
+    user_cache.invalidate(telegram_user_id)
+    user = await run(_add_user, telegram_user_id, username, first_name, last_name, join_date, paid_until,
+                     date.today())
+    user_cache.put(telegram_user_id, user)
+    _publish({telegram_user_id: user.paid_until_day})
+    return user
+
+
+def _extend_subscription(conn, telegram_user_id, today, days):
+    user = _get_user(conn, telegram_user_id)
+    today_str = format_date(today)
+
+    old_paid_until = None
+    if user is None:
+        if not _restore_users(conn, [telegram_user_id], today):
+            # User doesn't exist: create new record with `days` of access.
+            new_paid_until = format_date(compute_new_paid_until(None, today, days))
+            _record_stats(conn, today, approvals=1, approved_days=days)
+            return _add_user(conn, telegram_user_id, "", "", "", today_str, new_paid_until, today)
+        # A removed user returning gets `days` from today, like a new one, but keeps the history
+        user = _get_user(conn, telegram_user_id)
+    else:
+        old_paid_until = parse_date(user.paid_until)
+
+    new_paid_until = format_date(compute_new_paid_until(old_paid_until, today, days))
+    conn.execute("""
+        UPDATE users
+        SET paid_until = ?, paid_until_day = ?, last_payment_date = ?
+        WHERE id = ?
+    """, (new_paid_until, to_day(new_paid_until), today_str, user.id))
+    conn.execute("""
+        INSERT INTO payments (user_id, payment_date, paid_until)
+        VALUES (?, ?, ?)
+    """, (user.id, today_str, new_paid_until))
+    _record_stats(conn, today, approvals=1, renewals=1, approved_days=days)
+    return _get_user(conn, telegram_user_id)
+
+
+async def extend_subscription(telegram_user_id: int, today: date, days: int = 30) -> str:
+    """
+    Approve a payment: create the user or extend paid_until, recording the payment.
+    Returns the new paid_until as 'YYYY-MM-DD'.
+    """
+    user_cache.invalidate(telegram_user_id)
+    user = await run(_extend_subscription, telegram_user_id, today, days)
+    user_cache.put(telegram_user_id, user)
+    _publish({telegram_user_id: user.paid_until_day})
+    return user.paid_until
+
+
+def _extend_subscriptions(conn, approvals, today):
+    uids = list(dict.fromkeys(uid for uid, _ in approvals))
+    current = {}
+    # Stay under SQLite's bound-parameter limit
+    for start in range(0, len(uids), 500):
+        chunk = uids[start:start + 500]
+        current.update((row[0], (row[1], parse_date(row[2]))) for row in conn.execute(f"""
+            SELECT telegram_user_id, id, paid_until FROM users
+            WHERE telegram_user_id IN ({",".join("?" * len(chunk))}) AND removed_at IS NULL
+        """, chunk))
+    # Returning users keep their row and history but start over from today, as in extend_subscription
+    restored = _restore_users(conn, [uid for uid in uids if uid not in current], today)
+    for uid in restored:
+        current[uid] = (_get_user(conn, uid).id, None)
+
+    # One pass in approval order; a user approved twice is extended twice
+    paid_until = {uid: old for uid, (_, old) in current.items()}
+    payments = []
+    for uid, days in approvals:
+        paid_until[uid] = compute_new_paid_until(paid_until.get(uid), today, days)
+        if uid in current:
+            payments.append((uid, paid_until[uid]))
+        else:
+            # Created with this approval, as extend_subscription does; later ones are payments
+            current[uid] = (None, None)
+
+    today_str = format_date(today)
+    new_rows = [uid for uid, (row_id, _) in current.items() if row_id is None]
+    conn.executemany("""
+        INSERT INTO users (telegram_user_id, username, first_name, last_name, join_date, paid_until,
+                           last_payment_date, paid_until_day)
+        VALUES (?, '', '', '', ?, ?, ?, ?)
+    """, [(uid, today_str, format_date(paid_until[uid]), today_str, to_day(paid_until[uid])) for uid in new_rows])
+    conn.executemany("""
+        UPDATE users SET paid_until = ?, paid_until_day = ?, last_payment_date = ?
+        WHERE telegram_user_id = ?
+    """, [(format_date(paid_until[uid]), to_day(paid_until[uid]), today_str, uid)
+          for uid in uids if uid not in new_rows])
+    conn.executemany("""
+        INSERT INTO payments (user_id, payment_date, paid_until)
+        SELECT id, ?, ? FROM users WHERE telegram_user_id = ?
+    """, [(today_str, format_date(new_paid_until), uid) for uid, new_paid_until in payments])
+    _record_stats(conn, today, members=len(new_rows), new_members=len(new_rows), approvals=len(approvals),
+                  renewals=len(payments), approved_days=sum(days for _, days in approvals))
+    users = {}
+    for start in range(0, len(uids), 500):
+        chunk = uids[start:start + 500]
+        users.update((user.telegram_user_id, user) for user in map(_row_to_user, conn.execute(f"""
+            SELECT {USER_COLUMNS} FROM users
+            WHERE telegram_user_id IN ({",".join("?" * len(chunk))}) AND removed_at IS NULL
+        """, chunk)))
+    return {uid: users[uid] for uid in uids}, set(new_rows) | set(restored)
+
+
+async def extend_subscriptions(approvals: List[tuple], today: date) -> Tuple[Dict[int, str], Set[int]]:
+    """
+    Approve many payments in one transaction. `approvals` are
+    (telegram_user_id, days) pairs, applied in order with the same rules as
+    extend_subscription. Returns ({telegram_user_id: new paid_until}, the
+    telegram_user_ids that were created or restored, i.e. not members yet).
+    """
+    for uid, _ in approvals:
+        user_cache.invalidate(uid)
+    users, joined = await run(_extend_subscriptions, approvals, today)
+    for uid, user in users.items():
+        user_cache.put(uid, user)
+    _publish({uid: user.paid_until_day for uid, user in users.items()})
+    return {uid: user.paid_until for uid, user in users.items()}, joined
+
+
+def _remove_users(conn, telegram_user_ids, now):
+    cursor = conn.executemany("""
+        UPDATE users SET removed_at = ?, paid_until_day = NULL
+        WHERE telegram_user_id = ? AND removed_at IS NULL
+    """, [(now, uid) for uid in telegram_user_ids])
+    _record_stats(conn, date.fromtimestamp(now), members=-cursor.rowcount, removals=cursor.rowcount)
+    return cursor.rowcount
+
+
+def _delete_user(conn, telegram_user_id):
+    return _remove_users(conn, [telegram_user_id], time.time()) > 0
+
+
+async def delete_user(telegram_user_id: int) -> bool:
+    """
+    Remove a user. The row is tombstoned and moved to users_archive later by
+    archive_removed_users(). Returns True if a live user was removed.
+    """
+    user_cache.invalidate(telegram_user_id)
+    deleted = await run(_delete_user, telegram_user_id)
+    user_cache.put(telegram_user_id, None)
+    if deleted:
+        _publish({telegram_user_id: None})
+    return deleted
+
+
+def _get_paid_until_days(conn):
+    return dict(conn.execute("SELECT telegram_user_id, paid_until_day FROM users WHERE removed_at IS NULL"))
+
+
+async def get_paid_until_days() -> Dict[int, Optional[int]]:
+    """Return {telegram_user_id: paid_until_day} for every user in one query."""
+    return await read(_get_paid_until_days)
+
+
+def _get_paid_until_days_between(conn, after_day, last_day):
+    return dict(conn.execute(
+        "SELECT telegram_user_id, paid_until_day FROM users WHERE paid_until_day > ? AND paid_until_day <= ?",
+        (after_day, last_day),
+    ))
+
+
+async def get_paid_until_days_between(after: Optional[date], until: date) -> Dict[int, int]:
+    """
+    {telegram_user_id: paid_until_day} for users expiring after `after` (None:
+    any time) and on or before `until`, as a range scan on paid_until_day.
+    """
+    return await read(_get_paid_until_days_between, to_day(after) if after else -1, to_day(until))
+
+
+def _upsert_members(conn, rows, today):
+    uids = list(dict.fromkeys(row[0] for row in rows))
+    _restore_users(conn, uids, today)
+    existing = 0
+    # Stay under SQLite's bound-parameter limit
+    for start in range(0, len(uids), 500):
+        chunk = uids[start:start + 500]
+        existing += conn.execute(
+            f"SELECT COUNT(*) FROM users WHERE telegram_user_id IN ({','.join('?' * len(chunk))})", chunk
+        ).fetchone()[0]
+    _record_stats(conn, today, members=len(uids) - existing, new_members=len(uids) - existing)
+    conn.executemany("""
+        INSERT INTO users (telegram_user_id, username, first_name, last_name, join_date, paid_until, paid_until_day)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (telegram_user_id) DO UPDATE SET
+            paid_until = excluded.paid_until,
+            paid_until_day = excluded.paid_until_day
+    """, [(uid, username, first, last, join_date, paid_until, to_day(paid_until))
+          for uid, username, first, last, join_date, paid_until in rows])
+
+
+async def upsert_members(rows: List[tuple]) -> None:
+    """
+    Insert or update many channel members in one transaction. Each row is
+    (telegram_user_id, username, first_name, last_name, join_date, paid_until);
+    existing users only get their paid_until refreshed.
+    """
+    for row in rows:
+        user_cache.invalidate(row[0])
+    await run(_upsert_members, rows, date.today())
+    # Again after the commit: a read that started during the write saw the old rows
+    for row in rows:
+        user_cache.invalidate(row[0])
+    _publish({row[0]: to_day(row[5]) for row in rows})
+
+
+def _apply_batch(conn, deletes, updates):
+    if deletes:
+        _remove_users(conn, deletes, time.time())
+    if updates:
+        conn.executemany(
+            "UPDATE users SET paid_until = ?, paid_until_day = ? WHERE telegram_user_id = ?",
+            [(paid_until, to_day(paid_until), uid) for uid, paid_until in updates],
+        )
+
+
+async def apply_batch(deletes: List[int], updates: List[tuple]) -> None:
+    """
+    Apply many removals and (telegram_user_id, paid_until) updates with
+    executemany in a single transaction.
+    """
+    for uid in deletes:
+        user_cache.invalidate(uid)
+    for uid, _ in updates:
+        user_cache.invalidate(uid)
+    await run(_apply_batch, deletes, updates)
+    for uid in deletes:
+        user_cache.put(uid, None)
+    # Again after the commit: a read that started during the write saw the old row
+    for uid, _ in updates:
+        user_cache.invalidate(uid)
+    changes = {uid: to_day(paid_until) for uid, paid_until in updates}
+    changes.update((uid, None) for uid in deletes)
+    _publish(changes)
+
+
+def _list_expiring(conn, until_day):
+    cursor = conn.execute(f"""
+        SELECT {USER_COLUMNS} FROM users
+        WHERE paid_until_day <= ?
+        ORDER BY paid_until_day, telegram_user_id
+    """, (until_day,))
+    return [_row_to_user(row) for row in cursor.fetchall()]
+
+
+async def list_expiring(until: date) -> List[User]:
+    """
+    Return users whose subscription ends on or before `until`, soonest first.
+    Served by a range scan on idx_users_paid_until_day.
+    """
+    return await read(_list_expiring, to_day(until))
+
+
+def _count_expiring(conn, until_day):
+    return conn.execute("SELECT COUNT(*) FROM users WHERE paid_until_day <= ?", (until_day,)).fetchone()[0]
+
+
+async def count_expiring(until: date) -> int:
+    return await read(_count_expiring, to_day(until))
+
+
+def _expiring_page(conn, until_day, after, before, limit):
+    # Keyset pagination on (paid_until_day, telegram_user_id): each page is a
+    # bounded range scan of idx_users_paid_until_day, however deep it is.
+    if before is not None:
+        cursor = conn.execute(f"""
+            SELECT {USER_COLUMNS} FROM users
+            WHERE paid_until_day <= ? AND (paid_until_day, telegram_user_id) < (?, ?)
+            ORDER BY paid_until_day DESC, telegram_user_id DESC
+            LIMIT ?
+        """, (until_day, *before, limit + 1))
+        rows = cursor.fetchall()
+        return [_row_to_user(row) for row in reversed(rows[:limit])], len(rows) > limit
+    if after is None:
+        after = (-1, -1)
+    cursor = conn.execute(f"""
+        SELECT {USER_COLUMNS} FROM users
+        WHERE paid_until_day <= ? AND (paid_until_day, telegram_user_id) > (?, ?)
+        ORDER BY paid_until_day, telegram_user_id
+        LIMIT ?
+    """, (until_day, *after, limit + 1))
+    rows = cursor.fetchall()
+    return [_row_to_user(row) for row in rows[:limit]], len(rows) > limit
+
+
+async def expiring_page(until: date, limit: int, after: Optional[tuple] = None,
+                        before: Optional[tuple] = None) -> Tuple[List[User], bool]:
+    """
+    One page of list_expiring(until). `after`/`before` are the
+    (paid_until_day, telegram_user_id) key of the last/first row of the
+    neighbouring page. Returns the users and whether more rows lie beyond
+    them in the direction of travel.
+    """
+    return await read(_expiring_page, to_day(until), after, before, limit)
+
+
+async def iter_expiring(until: date, chunk: int = 1000):
+    """Yield every user list_expiring(until) would return, `chunk` rows per query."""
+    after = None
+    while True:
+        users, more = await expiring_page(until, chunk, after=after)
+        for user in users:
+            yield user
+        if not more:
+            return
+        after = (users[-1].paid_until_day, users[-1].telegram_user_id)
+
+
+# --- Archive -----------------------------------------------------------------
+
+def _archive_removed_users(conn, limit, now):
+    ids = [row[0] for row in conn.execute(
+        "SELECT id FROM users WHERE removed_at IS NOT NULL LIMIT ?", (limit,)
+    )]
+    if not ids:
+        return 0
+    placeholders = ",".join("?" * len(ids))
+    conn.execute(f"""
+        INSERT OR REPLACE INTO users_archive
+            (id, telegram_user_id, username, first_name, last_name, join_date, paid_until, last_payment_date,
+             removed_at, archived_at)
+        SELECT id, telegram_user_id, username, first_name, last_name, join_date, paid_until, last_payment_date,
+               removed_at, ?
+        FROM users WHERE id IN ({placeholders})
+    """, [now, *ids])
+    conn.execute(f"""
+        INSERT OR REPLACE INTO payments_archive (id, user_id, payment_date, paid_until)
+        SELECT id, user_id, payment_date, paid_until FROM payments WHERE user_id IN ({placeholders})
+    """, ids)
+    conn.execute(f"DELETE FROM payments WHERE user_id IN ({placeholders})", ids)
+    conn.execute(f"DELETE FROM users WHERE id IN ({placeholders})", ids)
+    return len(ids)
+
+
+async def archive_removed_users(batch_size: int = 500) -> int:
+    """
+    Move tombstoned users and their payments to the archive tables, one
+    transaction per `batch_size` users so writers are never blocked for long.
+    Returns how many users were archived.
+    """
+    archived = 0
+    while True:
+        moved = await run(_archive_removed_users, batch_size, time.time())
+        archived += moved
+        if moved < batch_size:
+            return archived
+
+
+# --- Reminder log ------------------------------------------------------------
+
+@dataclass(frozen=True)
+class DueReminder:
+    user: User
+    kind: str
+    notified: bool
+
+
+# Users expiring by tomorrow, tagged with the reminder they are due. The
+# anti-join against the notifications primary key skips reminders already
+# queued for this paid_until_day. Expired users are always returned (they
+# still have to be removed), flagged if already warned.
+_DUE_REMINDERS_SQL = f"""
+    SELECT due.*, n.telegram_user_id IS NOT NULL
+    FROM (
+        SELECT {USER_COLUMNS},
+               CASE WHEN paid_until_day > :today THEN 'tomorrow'
+                    WHEN paid_until_day = :today THEN 'today'
+                    ELSE 'expired' END AS kind
+        FROM users
+        WHERE paid_until_day <= :today + 1 AND {{condition}}
+    ) AS due
+    LEFT JOIN notifications n
+        ON n.telegram_user_id = due.telegram_user_id AND n.kind = due.kind
+       AND n.paid_until_day = due.paid_until_day
+    WHERE n.telegram_user_id IS NULL OR due.kind = 'expired'
+    ORDER BY due.paid_until_day, due.telegram_user_id
+"""
+
+
+def _to_due_reminder(row):
+    return DueReminder(_row_to_user(row[:-2]), row[-2], bool(row[-1]))
+
+
+def _due_reminders(conn, today_day, after, limit):
+    rows = conn.execute(
+        _DUE_REMINDERS_SQL.format(condition="(paid_until_day, telegram_user_id) > (:after_day, :after_uid)")
+        + " LIMIT :limit",
+        {"today": today_day, "after_day": after[0], "after_uid": after[1], "limit": limit + 1},
+    ).fetchall()
+    return [_to_due_reminder(row) for row in rows[:limit]], len(rows) > limit
+
+
+async def due_reminders(today: date, limit: int, after: Optional[tuple] = None) -> Tuple[List[DueReminder], bool]:
+    """
+    Users expiring by tomorrow who still need a reminder, soonest first, one
+    keyset page after the (paid_until_day, telegram_user_id) key `after`.
+    Returns the page and whether more rows follow.
+    """
+    return await read(_due_reminders, to_day(today), after or (-1, -1), limit)
+
+
+def _due_reminders_for(conn, today_day, uids):
+    reminders = []
+    # Stay under SQLite's bound-parameter limit
+    for start in range(0, len(uids), 500):
+        chunk = uids[start:start + 500]
+        params = {"today": today_day, **{f"u{i}": uid for i, uid in enumerate(chunk)}}
+        condition = f"telegram_user_id IN ({', '.join(':u' + str(i) for i in range(len(chunk)))})"
+        rows = conn.execute(_DUE_REMINDERS_SQL.format(condition=condition), params).fetchall()
+        reminders.extend(_to_due_reminder(row) for row in rows)
+    return reminders
+
+
+async def due_reminders_for(today: date, telegram_user_ids: Iterable[int]) -> List[DueReminder]:
+    """Like due_reminders(), restricted to the given users."""
+    return await read(_due_reminders_for, to_day(today), list(dict.fromkeys(telegram_user_ids)))
+
+
+def _enqueue_notifications(conn, notifications, now):
+    _enqueue_messages(conn, [(chat_id, text, parse_mode) for chat_id, text, parse_mode, _, _ in notifications], now)
+    conn.executemany("""
+        INSERT OR IGNORE INTO notifications (telegram_user_id, kind, paid_until_day, sent_at)
+        VALUES (?, ?, ?, ?)
+    """, [(chat_id, kind, paid_until_day, now) for chat_id, _, _, kind, paid_until_day in notifications])
+
+
+async def enqueue_notifications(notifications: List[tuple], now: float) -> None:
+    """
+    Queue (chat_id, text, parse_mode, kind, paid_until_day) reminders and log
+    them as sent in the same transaction, so a message is never queued twice
+    nor logged without being queued.
+    """
+    await run(_enqueue_notifications, notifications, now)
+
+
+def _purge_notifications(conn, before_day):
+    return conn.execute("DELETE FROM notifications WHERE paid_until_day < ?", (before_day,)).rowcount
+
+
+async def purge_notifications(before: date) -> int:
+    """Forget reminders about expiry dates before `before`."""
+    return await run(_purge_notifications, to_day(before))
+
+
+# --- Channel member snapshot ----------------------------------------------
+
+def _get_member_snapshot(conn):
+    return {row[0] for row in conn.execute("SELECT telegram_user_id FROM channel_members")}
+
+
+async def get_member_snapshot() -> Set[int]:
+    """Return the member ids recorded by the last participant sync."""
+    return await read(_get_member_snapshot)
+
+
+def _save_member_snapshot(conn, joined, left, digest, watermark):
+    conn.executemany(
+        "INSERT OR REPLACE INTO channel_members (telegram_user_id, join_date) VALUES (?, ?)", joined
+    )
+    conn.executemany("DELETE FROM channel_members WHERE telegram_user_id = ?", [(uid,) for uid in left])
+    _set_state(conn, "member_digest", digest)
+    _set_state(conn, "member_log_watermark", watermark)
+
+
+async def save_member_snapshot(joined: List[tuple], left: Iterable[int], digest: str, watermark: str) -> None:
+    """
+    Apply a sync's set differences to the snapshot in one transaction, with
+    the admin log position it is current up to. joined holds
+    (telegram_user_id, join_date) rows.
+    """
+    await run(_save_member_snapshot, joined, list(left), digest, watermark)
+
+
+# --- Outbox ------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class OutboxMessage:
+    id: int
+    chat_id: int
+    text: str
+    parse_mode: Optional[str]
+    attempts: int
+
+
+def _enqueue_messages(conn, messages, now):
+    conn.executemany("""
+        INSERT INTO outbox (chat_id, text, parse_mode, next_attempt_at, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, [(chat_id, text, parse_mode, now, now) for chat_id, text, parse_mode in messages])
+
+
+async def enqueue_messages(messages: List[tuple], now: float) -> None:
+    """Add (chat_id, text, parse_mode) messages to the outbox in one transaction."""
+    await run(_enqueue_messages, messages, now)
+
+
+def _claim_outbox(conn, now, limit):
+    rows = conn.execute("""
+        SELECT id, chat_id, text, parse_mode, attempts FROM outbox
+        WHERE status = 'pending' AND next_attempt_at <= ?
+        ORDER BY next_attempt_at, id
+        LIMIT ?
+    """, (now, limit)).fetchall()
+    conn.executemany("UPDATE outbox SET status = 'sending' WHERE id = ?", [(row[0],) for row in rows])
+    return [OutboxMessage(*row) for row in rows]
+
+
+async def claim_outbox(now: float, limit: int) -> List[OutboxMessage]:
+    """Mark up to `limit` due messages as in flight and return them."""
+    return await run(_claim_outbox, now, limit)
+
+
+def _next_outbox_due(conn):
+    row = conn.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'").fetchone()
+    return row[0]
+
+
+async def next_outbox_due() -> Optional[float]:
+    """Epoch time of the next pending message, or None if the outbox is empty."""
+    return await read(_next_outbox_due)
+
+
+def _finish_outbox(conn, sent_ids, retries, dead):
+    conn.executemany("DELETE FROM outbox WHERE id = ?", [(message_id,) for message_id in sent_ids])
+    conn.executemany("""
+        UPDATE outbox SET status = 'pending', attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+        WHERE id = ?
+    """, [(next_at, error, message_id) for message_id, next_at, error in retries])
+    conn.executemany("""
+        UPDATE outbox SET status = 'dead', attempts = attempts + 1, last_error = ?
+        WHERE id = ?
+    """, [(error, message_id) for message_id, error in dead])
+
+
+async def finish_outbox(sent_ids: List[int], retries: List[tuple], dead: List[tuple]) -> None:
+    """
+    Record delivery results in one transaction: sent messages are removed,
+    retries are (id, next_attempt_at, error), dead letters are (id, error).
+    """
+    await run(_finish_outbox, sent_ids, retries, dead)
+
+
+def _reset_outbox_in_flight(conn):
+    return conn.execute("UPDATE outbox SET status = 'pending' WHERE status = 'sending'").rowcount
+
+
+async def reset_outbox_in_flight() -> int:
+    """Return messages left in flight by a crash to the pending state."""
+    return await run(_reset_outbox_in_flight)
+
+
+# --- Invite links ------------------------------------------------------------
+
+def _add_invite_links(conn, links, now):
+    conn.executemany("""
+        INSERT OR IGNORE INTO invite_links (invite_link, created_at, expires_at) VALUES (?, ?, ?)
+    """, [(link, now, expires_at) for link, expires_at in links])
+
+
+async def add_invite_links(links: List[tuple], now: float) -> None:
+    """Store freshly created (invite_link, expires_at) pairs as available."""
+    await run(_add_invite_links, links, now)
+
+
+def _available_invite_links(conn, valid_after):
+    conn.execute("""
+        UPDATE invite_links SET status = 'expired' WHERE status = 'available' AND expires_at <= ?
+    """, (valid_after,))
+    return conn.execute("""
+        SELECT invite_link, expires_at FROM invite_links
+        WHERE status = 'available'
+        ORDER BY expires_at
+    """).fetchall()
+
+
+async def available_invite_links(valid_after: float) -> List[tuple]:
+    """
+    (invite_link, expires_at) of every unassigned link, soonest expiry first.
+    Links expiring before `valid_after` are retired instead.
+    """
+    return await run(_available_invite_links, valid_after)
+
+
+def _assign_invite_links(conn, assignments, now):
+    conn.executemany("""
+        UPDATE invite_links SET status = 'assigned', telegram_user_id = ?, assigned_at = ?
+        WHERE invite_link = ?
+    """, [(telegram_user_id, now, link) for link, telegram_user_id in assignments])
+
+
+async def assign_invite_links(assignments: List[tuple], now: float) -> None:
+    """Record (invite_link, telegram_user_id) hand-outs in one transaction."""
+    await run(_assign_invite_links, assignments, now)
+
+
+def _use_invite_link(conn, link, used_by, now):
+    row = conn.execute("SELECT telegram_user_id FROM invite_links WHERE invite_link = ?", (link,)).fetchone()
+    if row is None:
+        return None
+    conn.execute("""
+        UPDATE invite_links SET status = 'used', used_at = ?, used_by = ? WHERE invite_link = ?
+    """, (now, used_by, link))
+    return row[0]
+
+
+async def use_invite_link(link: str, used_by: int, now: float) -> Optional[int]:
+    """
+    Record that `used_by` joined through `link`. Returns the telegram_user_id
+    the link was handed to, or None for links this bot did not create.
+    """
+    return await run(_use_invite_link, link, used_by, now)
+
+
+def _revocable_invite_links(conn, telegram_user_id):
+    if telegram_user_id is None:
+        cursor = conn.execute("SELECT invite_link FROM invite_links WHERE status IN ('available', 'assigned')")
+    else:
+        cursor = conn.execute("""
+            SELECT invite_link FROM invite_links WHERE status = 'assigned' AND telegram_user_id = ?
+        """, (telegram_user_id,))
+    return [row[0] for row in cursor]
+
+
+async def revocable_invite_links(telegram_user_id: Optional[int] = None) -> List[str]:
+    """Unused links handed to telegram_user_id, or every unused link when None."""
+    return await read(_revocable_invite_links, telegram_user_id)
+
+
+def _mark_invite_links_revoked(conn, links):
+    conn.executemany("UPDATE invite_links SET status = 'revoked' WHERE invite_link = ?", [(link,) for link in links])
+
+
+async def mark_invite_links_revoked(links: List[str]) -> None:
+    await run(_mark_invite_links_revoked, links)
+
+
+# --- Stats -------------------------------------------------------------------
+
+STATS_COLUMNS = ("new_members", "approvals", "renewals", "approved_days", "removals", "restored")
+
+
+def _record_stats(conn, day, members=0, **counts):
+    """Add to day's stats_daily row and the live member count, inside the caller's transaction."""
+    counts = {column: value for column, value in counts.items() if value}
+    if counts:
+        columns = ", ".join(counts)
+        conn.execute(f"""
+            INSERT INTO stats_daily (day, {columns}) VALUES (?{", ?" * len(counts)})
+            ON CONFLICT (day) DO UPDATE SET {", ".join(f"{c} = {c} + excluded.{c}" for c in counts)}
+        """, (format_date(day), *counts.values()))
+    if members:
+        conn.execute("UPDATE stats_counters SET value = value + ? WHERE name = 'members'", (members,))
+
+
+def _get_stats(conn, today, periods):
+    members = conn.execute("SELECT value FROM stats_counters WHERE name = 'members'").fetchone()
+    # Expired but not removed yet: a short range scan, the expiry run keeps it small
+    expired = conn.execute("SELECT COUNT(*) FROM users WHERE paid_until_day < ?", (to_day(today),)).fetchone()[0]
+    totals = {}
+    for name, since in periods.items():
+        row = conn.execute(f"""
+            SELECT {", ".join(f"COALESCE(SUM({c}), 0)" for c in STATS_COLUMNS)}
+            FROM stats_daily WHERE day >= ? AND day <= ?
+        """, (format_date(since), format_date(today))).fetchone()
+        totals[name] = dict(zip(STATS_COLUMNS, row))
+    return {"members": members[0] if members else 0, "expired": expired, "periods": totals}
+
+
+async def get_stats(today: date, periods: Dict[str, date]) -> dict:
+    """
+    The /stats figures: {"members", "expired", "periods": {name: {column: sum}}}
+    summed from stats_daily for each period from its start date to `today`.
+    Reads one counter and a few daily rows, never the users or payments tables.
+    """
+    return await read(_get_stats, today, periods)
+
+
+def _get_daily_stats(conn):
+    return conn.execute(f"SELECT day, {', '.join(STATS_COLUMNS)} FROM stats_daily ORDER BY day").fetchall()
+
+
+async def get_daily_stats() -> List[tuple]:
+    """Every stats_daily rollup as (day, *STATS_COLUMNS), oldest first."""
+    return await read(_get_daily_stats)
+
+
+# --- Key/value state ---------------------------------------------------------
+
+def _get_state(conn, key):
+    row = conn.execute("SELECT value FROM app_state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _set_state(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO app_state (key, value) VALUES (?, ?)", (key, value))
+
+
+async def get_state(key: str) -> Optional[str]:
+    return await read(_get_state, key)
+
+
+async def set_state(key: str, value: str) -> None:
+    await run(_set_state, key, value)
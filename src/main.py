@@ -1,28 +1,91 @@
 # main.py
 
+from telegram import Update
 from telegram.ext import ApplicationBuilder
 from bot.commands import get_handlers
-from bot.listener import get_listeners
-from config.config import BOT_TOKEN
+from bot.expiry import expiry_scheduler
+from bot.invites import invite_pool
+from bot.listener import get_chat_member_handlers, get_listeners
+from bot.webhook import run_webhook
+from config.config import BOT_MODE, BOT_TOKEN, CONCURRENT_UPDATES, HTTP_READ_TIMEOUT, METRICS_HOST, METRICS_PORT
 from db.database import init_db  # ✅ Import database initialization
+from db.repository import init_repository, close_repository
+from bot.notifier import admin_notifier
+from bot.outbox import outbox_worker
+from bot.processor import KeyedUpdateProcessor
+from bot.subscribers import subscribers
+from bot.telegram_api import api, build_request
+from cron.jobs import register_jobs
+from utils.http import start_http_server
+from utils.metrics import handle_metrics_request
+
+async def post_init(app) -> None:
+    # Start background workers once the event loop is running
+    api.attach(app.bot)
+    outbox_worker.start()
+    admin_notifier.start()
+    await subscribers.start()
+    await invite_pool.start()
+    await expiry_scheduler.start()
+    await register_jobs(app)
+    if METRICS_PORT:
+        app.bot_data["metrics_server"] = await start_http_server(
+            METRICS_HOST, METRICS_PORT, handle_metrics_request, read_timeout=HTTP_READ_TIMEOUT
+        )
+
+async def post_stop(app) -> None:
+    # Hand queued admin notifications to the outbox, then stop its workers;
+    # undelivered messages stay in the outbox table for the next start
+    await expiry_scheduler.stop()
+    await invite_pool.stop()
+    subscribers.stop()
+    await admin_notifier.stop()
+    await outbox_worker.stop()
+
+async def post_shutdown(app) -> None:
+    # Close the metrics endpoint and pooled DB connections once the bot stops
+    metrics_server = app.bot_data.pop("metrics_server", None)
+    if metrics_server:
+        metrics_server.close()
+        await metrics_server.wait_closed()
+    await close_repository()
 
 def main():
     # ✅ Initialize the database before starting the bot
     init_db()
+    init_repository()
 
     # Create Application instead of Updater
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    # One tuned HTTP connection pool for the bot, the jobs and the outbox
+    # Updates run concurrently, serialized per user (bot/processor.py)
+    app = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .request(build_request())
+        .concurrent_updates(KeyedUpdateProcessor(CONCURRENT_UPDATES))
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Add command handlers
     for handler in get_handlers():
         app.add_handler(handler)
 
+    # Match invite-link joins (bot/invites.py) and answer join requests (bot/subscribers.py)
+    for handler in get_chat_member_handlers():
+        app.add_handler(handler)
+
     # # Add listener handlers
     # for listener in get_listeners():
     #     app.add_handler(listener)
 
-    # Start the bot
-    app.run_polling()
+    # Start the bot; chat_member updates are only delivered when asked for
+    if BOT_MODE == "webhook":
+        run_webhook(app, allowed_updates=Update.ALL_TYPES)
+    else:
+        app.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,58 @@
+import asyncio
+from datetime import datetime, timezone
+
+from telegram import Chat, Message, Update, User
+from telegram.ext import ApplicationBuilder
+
+from bot.processor import KeyedUpdateProcessor
+
+
+def _update(update_id, user_id):
+    user = User(user_id, f"user{user_id}", False)
+    message = Message(update_id, datetime.now(timezone.utc), Chat(user_id, Chat.PRIVATE), from_user=user, text="hola")
+    return Update(update_id, message=message)
+
+
+async def _run(processor, updates, duration=0.05):
+    events = []
+
+    async def handle(name):
+        events.append(("start", name))
+        await asyncio.sleep(duration)
+        events.append(("end", name))
+
+    await asyncio.gather(*(
+        processor.process_update(_update(i, user_id), handle(name))
+        for i, (name, user_id) in enumerate(updates)
+    ))
+    return events
+
+
+def test_builds_application():
+    processor = KeyedUpdateProcessor(4)
+    application = ApplicationBuilder().token("123:abc").concurrent_updates(processor).build()
+    assert application.update_processor is processor
+    assert processor.max_concurrent_updates == 4
+
+
+def test_same_key_in_order_other_keys_in_parallel():
+    processor = KeyedUpdateProcessor(2)
+    events = asyncio.run(_run(processor, [("a1", 1), ("a2", 1), ("a3", 1), ("b1", 2)]))
+
+    a_events = [event for event in events if event[1].startswith("a")]
+    assert a_events == [
+        ("start", "a1"), ("end", "a1"), ("start", "a2"), ("end", "a2"), ("start", "a3"), ("end", "a3"),
+    ]
+    # a2 and a3 wait for their key without holding one of the two slots
+    assert events.index(("start", "b1")) < events.index(("end", "a1"))
+
+
+def test_limit_applies_across_keys():
+    processor = KeyedUpdateProcessor(2)
+    events = asyncio.run(_run(processor, [(f"u{user_id}", user_id) for user_id in range(5)]))
+
+    running = peak = 0
+    for kind, _ in events:
+        running += 1 if kind == "start" else -1
+        peak = max(peak, running)
+    assert peak == 2
@@ -0,0 +1,45 @@
+# utils/helpers.py
+
+from datetime import date, datetime, timedelta
+
+DATE_FORMAT = "%Y-%m-%d"
+SUBSCRIPTION_DAYS = 30
+
+
+def parse_date(value):
+    """Parse a 'YYYY-MM-DD' string (or pass through a date) into a date."""
+    if value is None or isinstance(value, date):
+        return value
+    return datetime.strptime(value, DATE_FORMAT).date()
+
+
+def format_date(value):
+    """Format a date as 'YYYY-MM-DD'."""
+    return value.strftime(DATE_FORMAT)
+
+
+def to_day(value):
+    """Convert a date (or 'YYYY-MM-DD' string) to the integer day ordinal stored in users.paid_until_day."""
+    value = parse_date(value)
+    return value.toordinal() if value is not None else None
+
+
+def from_day(day):
+    """Convert a users.paid_until_day ordinal back to a date."""
+    return date.fromordinal(day) if day is not None else None
+
+
+def compute_new_paid_until(old_paid_until, today, days=SUBSCRIPTION_DAYS):
+    """
+    Return the new paid_until date after an approved payment.
+      - No previous subscription: today + days.
+      - Still active or expired within `days`: extend from the old paid_until.
+      - Expired more than `days` ago: reset from today.
+    """
+    if old_paid_until is None:
+        return today + timedelta(days=days)
+    if old_paid_until >= today:
+        return old_paid_until + timedelta(days=days)
+    if (today - old_paid_until).days > days:
+        return today + timedelta(days=days)
+    return old_paid_until + timedelta(days=days)
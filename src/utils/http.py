@@ -0,0 +1,129 @@
+# utils/http.py
+
+import asyncio
+import logging
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 1024 * 1024
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    """A request that can't be read; answered with `status`."""
+
+    def __init__(self, status):
+        super().__init__(REASONS.get(status, ""))
+        self.status = status
+
+
+class Request:
+    def __init__(self, method, target, headers, body):
+        self.method = method
+        parts = urlsplit(target)
+        self.path = parts.path
+        self.query = parts.query
+        self.headers = headers
+        self.body = body
+
+
+async def _read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400) from None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(400) from None
+    if length < 0:
+        raise HTTPError(400)
+    if length > MAX_BODY_SIZE:
+        raise HTTPError(413)
+    body = await reader.readexactly(length) if length else b""
+    return Request(method.upper(), target, headers, body)
+
+
+def _write_response(writer, status, body=b"", content_type="text/plain; charset=utf-8", headers=None):
+    lines = [
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        "Connection: close",
+    ]
+    for name, value in (headers or {}).items():
+        lines.append(f"{name}: {value}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+
+
+async def start_http_server(host, port, handler, max_connections=None, read_timeout=10.0):
+    """
+    Minimal asyncio HTTP/1.1 server, one request per connection.
+    `handler(request)` returns (status, body) or (status, body, content_type[, headers]).
+    At most `max_connections` connections are open at once; more are answered
+    503 and closed. A client gets `read_timeout` seconds to send its request.
+    """
+    limit = asyncio.Semaphore(max_connections) if max_connections else None
+
+    async def serve(reader, writer):
+        try:
+            if limit is None:
+                await _serve(reader, writer)
+            elif limit.locked():
+                _write_response(writer, 503)
+                await writer.drain()
+            else:
+                async with limit:
+                    await _serve(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve(reader, writer):
+        try:
+            request = await asyncio.wait_for(_read_request(reader), read_timeout)
+        except HTTPError as e:
+            _write_response(writer, e.status)
+            await writer.drain()
+            return
+        except asyncio.TimeoutError:
+            _write_response(writer, 408)
+            await writer.drain()
+            return
+        if request is None:
+            return
+        try:
+            response = await handler(request)
+        except Exception as e:
+            logger.error(f"❌ HTTP handler error on {request.path}: {e}")
+            response = (500, b"")
+        _write_response(writer, *response)
+        await writer.drain()
+
+    server = await asyncio.start_server(serve, host, port)
+    logger.info(f"🌐 HTTP server listening on {host}:{port}")
+    return server
@@ -0,0 +1,202 @@
+# utils/metrics.py
+
+import functools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """A gauge whose value is read from a callback at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, callback):
+        super().__init__(name, help_text)
+        self.callback = callback
+
+    def render(self):
+        try:
+            value = self.callback()
+        except Exception as e:
+            logger.error(f"❌ Gauge {self.name} failed: {e}")
+            return []
+        return self.header() + [f"{self.name} {_format_value(value)}"]
+
+
+class CallbackCounter(Gauge):
+    """A counter kept elsewhere (e.g. a cache's hit count), read from a callback at scrape time."""
+    kind = "counter"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        with self._lock:
+            items = sorted((labels, (list(s[0]), s[1], s[2])) for labels, s in self._series.items())
+        lines = self.header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, labels, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            plain = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{plain} {_format_value(total)}")
+            lines.append(f"{self.name}_count{plain} {count}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# --- Bot metrics ---------------------------------------------------------------
+
+HANDLER_DURATION = registry.register(Histogram(
+    "bot_handler_duration_seconds", "Time spent in each update handler.", ["handler"]))
+HANDLER_ERRORS = registry.register(Counter(
+    "bot_handler_errors_total", "Update handlers that raised.", ["handler"]))
+DB_QUERY_DURATION = registry.register(Histogram(
+    "db_query_duration_seconds", "Time spent running each repository statement.", ["query"]))
+DB_QUERY_ERRORS = registry.register(Counter(
+    "db_query_errors_total", "Repository statements that failed.", ["query"]))
+TELEGRAM_CALL_DURATION = registry.register(Histogram(
+    "telegram_api_call_duration_seconds", "Bot API call latency, including retries.", ["method"]))
+TELEGRAM_CALL_ERRORS = registry.register(Counter(
+    "telegram_api_errors_total", "Bot API calls that failed.", ["method", "error"]))
+TELEGRAM_RETRIES = registry.register(Counter(
+    "telegram_api_retries_total", "RetryAfter back-offs.", ["method"]))
+NOTIFY_RUN_DURATION = registry.register(Histogram(
+    "notify_users_run_duration_seconds", "Duration of notify_users runs.",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)))
+NOTIFY_USERS_PROCESSED = registry.register(Counter(
+    "notify_users_processed_total", "Users handled by notify_users, by outcome.", ["outcome"]))
+
+JOIN_REQUESTS = registry.register(Counter(
+    "join_requests_total", "Channel join requests, by decision.", ["decision"]))
+
+
+def instrument_handler(name, callback):
+    """Wrap an async update handler to record its latency and errors."""
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        with HANDLER_DURATION.time(name):
+            try:
+                return await callback(update, context)
+            except Exception:
+                HANDLER_ERRORS.inc(name)
+                raise
+
+    return wrapper
+
+
+async def handle_metrics_request(request):
+    if request.path != "/metrics":
+        return 404, b""
+    if request.method != "GET":
+        return 405, b""
+    return 200, registry.render().encode(), "text/plain; version=0.0.4; charset=utf-8"